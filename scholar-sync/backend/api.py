@@ -1,16 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from student import StudentModel, Student
-from kmeans import KMeansVariation
+import ingest
+import jobs
+import metrics
+import utils
+from pairing import CohortDelta, pair, pair_batch, pair_students, repair, results
+from student import StudentModel
 
 origins = [
     "https://park.ethanbaker.dev",
     "http://localhost:4200",
 ]
 
+# Seconds clients are told to wait before retrying while the model is still loading
+retry_after = 10
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model in the background so the server can bind its port immediately
+    utils.warm_up()
+    yield
+    jobs.queue.shutdown()
+    jobs.shutdown_pool()
+
 # Create the application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 base_path = "/api/v1/"
 app.add_middleware(
     CORSMiddleware,
@@ -20,28 +41,232 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post(base_path + "pairs")
-def create_pairs(models: list[StudentModel]):
-    # Turn StudentModels into Students
-    mentors = []
-    mentees = []
-    for m in models:
-        student = Student(model=m)
-
-        if m.role == "mentor":
-            mentors.append(student)
-        else:
-            mentees.append(student)
-
-    # Run kmeans on the list of students
-    k = len(mentors)
-    kmeans = KMeansVariation(k=k, clusters=mentors, max_iter=100)
-    clusters = kmeans.fit(mentees)
-
-    # Group students' names into pairs using the clusters
-    pairs = []
-    for i, cluster in enumerate(clusters):
-        pairs.append([student.name for student in cluster])
-
-    # Now clusters contains the grouped vectors
-    return {"pairs": pairs}
\ No newline at end of file
+# Embedding cache statistics are kept by the cache itself and read whenever metrics are scraped
+metrics.registry.sampled(
+    "embedding_cache_events_total", "Embedding cache lookups and evictions", "counter", "event",
+    lambda: {key: value for key, value in utils.embedding_cache.stats().items() if key in ["hits", "misses", "evictions"]},
+)
+
+# The same goes for the result cache, along with how full it is
+metrics.registry.sampled(
+    "pairing_result_cache_events_total", "Result cache lookups, hits read from its SQLite file, evictions and expirations", "counter", "event",
+    lambda: {key: value for key, value in results.stats().items() if key in ["hits", "disk_hits", "misses", "evictions", "expirations"]},
+)
+metrics.registry.sampled(
+    "pairing_result_cache_size", "Entries and encoded bytes held in memory by the result cache", "gauge", "unit",
+    lambda: {"entries": len(results), "bytes": results.stats()["bytes"]},
+)
+
+@app.middleware("http")
+async def track_start(request: Request, call_next):
+    # Remember when the request arrived, so the time spent reading and validating the body can be measured
+    request.state.started = time.perf_counter()
+    return await call_next(request)
+
+def finish(result: dict, endpoint: str, request: Request, debug: str|None, timings: dict|None = None) -> dict:
+    """
+    Record the instrumentation of a pairing in the metrics, and only keep it in the response when it was asked for
+
+    :param result: The result of the pairing, holding its instrumentation under "debug"
+    :param endpoint: The name of the endpoint reported in the metrics
+    :param request: The request being answered
+    :param debug: The debug output requested by the client
+    :param timings: Additional phase timings measured by the endpoint
+    :return: The response
+    """
+    stats = result.pop("debug")
+    stats["timings"].update(timings or {})
+    stats["timings"]["total"] = time.perf_counter() - request.state.started
+    metrics.record(endpoint, result["engine"], stats, result.get("cache"))
+
+    if debug == "timings":
+        result["debug"] = stats
+
+    return result
+
+def require_model() -> None:
+    """
+    Dependency of every endpoint that embeds students. Rather than block a worker on the model load, the client is
+    told to come back once it is loaded
+
+    :raises HTTPException: 503 with a `Retry-After` header while the model is still loading
+    """
+    if not utils.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="The word vector model is still loading, please retry shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus scrape endpoint
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+def healthz():
+    # The process is alive and serving requests
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    # The model is loaded and pairs can be created
+    if utils.is_ready():
+        return {"status": "ready"}
+
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    if utils.model_error is not None:
+        return {"status": "error", "detail": str(utils.model_error)}
+
+    return {"status": "loading"}
+
+@app.post(base_path + "pairs", dependencies=[Depends(require_model)])
+def create_pairs(
+    request: Request,
+    models: list[StudentModel],
+    engine: Literal["kmeans", "exact"] = "kmeans",
+    seed: int|None = None,
+    n_init: int = Query(1, ge=1, le=64),
+    n_jobs: int = Query(1, ge=1),
+    probes: int|None = Query(None, ge=1),
+    time_budget_ms: int|None = Query(None, ge=1),
+    tol: float = Query(0.0, ge=0, lt=1),
+    cache: bool = True,
+    debug: Literal["timings"]|None = None,
+):
+    # The body was read and validated before the handler was called
+    validation = time.perf_counter() - request.state.started
+
+    # The time budget counts from when the request arrived
+    if time_budget_ms is not None:
+        time_budget_ms = max(time_budget_ms - validation * 1000, 0)
+
+    # Pair the students using the selected engine
+    try:
+        n_jobs = min(n_jobs, os.cpu_count() or 1)
+        result = pair_students(models, engine, cache=cache, keep=True, seed=seed, n_init=n_init, n_jobs=n_jobs, probes=probes, time_budget_ms=time_budget_ms, tol=tol)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return finish(result, "pairs", request, debug, {"validation": validation})
+
+@app.post(base_path + "pairs/batch", dependencies=[Depends(require_model)])
+def create_batch_pairs(
+    request: Request,
+    cohorts: dict[str, list[StudentModel]],
+    engine: Literal["kmeans", "exact"] = "kmeans",
+    seed: int|None = None,
+    n_init: int = Query(1, ge=1, le=64),
+    n_jobs: int|None = Query(None, ge=1),
+    probes: int|None = Query(None, ge=1),
+    time_budget_ms: int|None = Query(None, ge=1),
+    tol: float = Query(0.0, ge=0, lt=1),
+    debug: Literal["timings"]|None = None,
+):
+    validation = time.perf_counter() - request.state.started
+
+    # The time budget counts from when the request arrived
+    if time_budget_ms is not None:
+        time_budget_ms = max(time_budget_ms - validation * 1000, 0)
+
+    # Pair every cohort, using every core unless told otherwise. Cohorts that can't be paired report their error.
+    # The time budget applies to each cohort's fit
+    n_jobs = min(n_jobs or os.cpu_count() or 1, os.cpu_count() or 1)
+    result = pair_batch(cohorts, engine, keep=True, n_jobs=n_jobs, seed=seed, n_init=n_init, probes=probes, time_budget_ms=time_budget_ms, tol=tol)
+
+    # The instrumentation of each cohort is only kept when asked for, like the batch's own
+    if debug != "timings":
+        for cohort in result["cohorts"].values():
+            cohort.pop("debug", None)
+
+    return finish(result, "batch", request, debug, {"validation": validation})
+
+@app.post(base_path + "pairs/{id}/repair", dependencies=[Depends(require_model)])
+def repair_pairs(
+    request: Request,
+    id: str,
+    delta: CohortDelta,
+    threshold: float = Query(0.0, ge=0, le=1),
+    debug: Literal["timings"]|None = None,
+):
+    validation = time.perf_counter() - request.state.started
+
+    # Update the kept pairs with the students that joined or left
+    try:
+        result = repair(id, delta, threshold)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired pairs")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return finish(result, "repair", request, debug, {"validation": validation})
+
+# Content types accepted by the streaming upload endpoint
+upload_formats = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+@app.post(base_path + "pairs/upload", dependencies=[Depends(require_model)])
+async def upload_pairs(
+    request: Request,
+    engine: Literal["kmeans", "exact"] = "kmeans",
+    seed: int|None = None,
+    n_init: int = Query(1, ge=1, le=64),
+    debug: Literal["timings"]|None = None,
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in upload_formats:
+        raise HTTPException(status_code=415, detail=f"Expected one of: {', '.join(upload_formats)}")
+
+    # Parse and vectorize rows while the upload is still arriving. Invalid rows are reported, not fatal
+    timings = {}
+    with metrics.timer(timings, "ingest"):
+        students, errors, rows = await ingest.ingest(request.stream(), upload_formats[content_type])
+
+    try:
+        result = await asyncio.to_thread(pair, students, engine, keep=True, seed=seed, n_init=n_init)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "errors": errors})
+
+    return {**finish(result, "upload", request, debug, timings), "rows": rows, "errors": errors}
+
+@app.post(base_path + "jobs", status_code=202)
+def create_job(
+    models: list[StudentModel],
+    engine: Literal["kmeans", "exact"] = "kmeans",
+    seed: int|None = None,
+    n_init: int = Query(1, ge=1, le=64),
+):
+    # Queue the pairing in a worker process. Workers start from a clean process and load the model themselves (see
+    # `jobs.start_worker`), so jobs can be queued while this process is still loading it. Restarts run serially there,
+    # the pool already uses every core
+    try:
+        job = jobs.queue.submit(pair_students, models, engine, seed=seed, n_init=n_init, n_jobs=1)
+    except jobs.QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(retry_after)})
+
+    return {"id": job.id, "status": job.status}
+
+@app.get(base_path + "jobs/{id}")
+async def get_job(id: str, wait: float = Query(0, ge=0, le=60), debug: Literal["timings"]|None = None):
+    job = jobs.queue.get(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    # Long-poll: hold the request until the job finishes or `wait` seconds pass
+    if wait > 0 and not job.future.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), wait)
+        except Exception:
+            # Timeouts and job errors are both reported through the job's status
+            pass
+
+    # Results keep their instrumentation, which is only shown when asked for
+    job = job.to_dict()
+    if "result" in job and debug != "timings":
+        job["result"] = {key: value for key, value in job["result"].items() if key != "debug"}
+
+    return job
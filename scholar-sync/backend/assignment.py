@@ -0,0 +1,90 @@
+import math
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+def default_capacity(n: int, k: int) -> int:
+    """
+    Find how many objects each of k groups takes when n objects are split as evenly as possible. This is
+    the same size `KMeansVariation` fills its clusters to
+
+    :param n: The number of objects to place
+    :param k: The number of groups
+    :return: The number of objects per group
+    """
+    if k <= 0:
+        return 0
+
+    return math.ceil(n / k)
+
+def candidate_groups(distances: np.ndarray[any], capacities: np.ndarray[any]) -> np.ndarray[any]:
+    """
+    Find the groups every object can be placed in by an optimal assignment. An object only goes to a group when every
+    group closer to it is full, and the closer groups can't hold more than the other n - 1 objects, so an object never
+    needs groups past the point where the capacity of the groups closer to it reaches n
+
+    :param distances: (n, k) matrix of distances from every object to every group
+    :param capacities: The maximum number of objects each of the k groups can take
+    :return: (n, k) boolean mask that is true for the groups each object can be placed in
+    """
+    n = len(distances)
+    order = np.argsort(distances, axis=1, kind="stable")
+    ordered = capacities[order]
+    closer = np.cumsum(ordered, axis=1) - ordered
+
+    candidates = np.zeros(distances.shape, dtype=bool)
+    np.put_along_axis(candidates, order, closer < n, axis=1)
+
+    return candidates
+
+def capacitated_assignment(distances: np.ndarray[any], capacities: list[int]) -> tuple[np.ndarray[any], float]:
+    """
+    Place every object into a group so the total distance is as small as possible while no group takes
+    more objects than its capacity.
+
+    Each group gets one slot per object it can take, and every object is joined to the slots of the groups it can
+    be placed in (see `candidate_groups`). A group never needs more slots than the objects joined to it, so large
+    capacities only add slots that can be used. The graph of objects and slots is solved exactly as a minimum weight
+    full bipartite matching, so memory and time grow with the number of edges rather than with n times the sum of
+    the capacities.
+
+    :param distances: (n, k) matrix of distances from every object to every group
+    :param capacities: The maximum number of objects each of the k groups can take
+    :return: The group index of every object and the total distance of the assignment
+    """
+    n, k = distances.shape
+    capacities = np.clip(np.asarray(capacities, dtype=np.int64), 0, n)
+    if len(capacities) != k:
+        raise ValueError(f"expected {k} capacities, got {len(capacities)}")
+    if capacities.sum() < n:
+        raise ValueError(f"groups can only take {capacities.sum()} of {n} objects")
+    if n == 0:
+        return np.empty(0, dtype=np.int64), 0.0
+
+    # Every group only needs a slot per object that can be placed in it
+    candidates = candidate_groups(distances, capacities)
+    slots = np.minimum(capacities, candidates.sum(axis=0))
+    owners = np.repeat(np.arange(k), slots)
+    objects, groups = np.nonzero(candidates)
+    counts = slots[groups]
+
+    if 2 * counts.sum() >= n * len(owners):
+        # Graphs with most of their edges are solved faster as a dense assignment, missing edges cost infinitely much
+        matrix = distances[:, owners]
+        matrix[~candidates[:, owners]] = math.inf
+        rows, cols = linear_sum_assignment(matrix)
+    else:
+        # One edge from every object to each slot of its groups. Weights are shifted away from zero, which the matching
+        # treats as a missing edge. Every object is matched once, so the shift doesn't change the best matching
+        ends = np.cumsum(counts)
+        first = np.cumsum(slots) - slots
+        edges = np.repeat(first[groups] - ends + counts, counts) + np.arange(ends[-1])
+        weights = np.repeat(distances[objects, groups] + 1.0, counts)
+        graph = csr_matrix((weights, (np.repeat(objects, counts), edges)), shape=(n, len(owners)))
+        rows, cols = min_weight_full_bipartite_matching(graph)
+
+    labels = np.empty(n, dtype=np.int64)
+    labels[rows] = owners[cols]
+
+    return labels, float(distances[rows, owners[cols]].sum())
@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# LRUCache is a bounded, thread-safe least-recently-used cache that keeps hit/miss/eviction statistics
+class LRUCache:
+    def __init__(self, maxsize: int):
+        """
+        Initialize an empty cache
+
+        :param maxsize: The maximum number of entries to keep. A size of zero disables caching
+        """
+        self.maxsize = maxsize
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Look up a key, marking it as the most recently used entry
+
+        :param key: The key to look up
+        :param default: The value to return if the key is not cached
+        :return: The cached value or `default`
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        """
+        Add or replace an entry, evicting the least recently used entries if the cache is full
+
+        :param key: The key to store the value under
+        :param value: The value to store
+        """
+        if self.maxsize <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the statistics
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Return the cache statistics
+
+        :return: dict holding the hit, miss and eviction counts as well as the current and maximum size
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+# ResultCache keeps JSON-friendly results for a limited time, bounded by both the number of entries and their
+# encoded size. Entries can also be written to a SQLite file, so they outlive the process and are shared by every
+# process using the same file
+class ResultCache:
+    def __init__(self, maxsize: int, maxbytes: int, ttl: float, path: str|None = None, disk_size: int = 10000):
+        """
+        Initialize an empty cache
+
+        :param maxsize: The maximum number of entries kept in memory. A size of zero disables caching
+        :param maxbytes: The maximum total size, in bytes of encoded JSON, of the entries kept in memory
+        :param ttl: The seconds an entry can be served for after it was stored
+        :param path: The SQLite file entries are also written to, or None to only keep them in memory
+        :param disk_size: The maximum number of entries kept in the SQLite file, the oldest are removed first
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.path = path
+        self.disk_size = disk_size
+
+        # Every entry is kept as its expiry time (in `time.time` seconds, so it means the same to every process)
+        # and its encoded value
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        # Connections can't be shared with forked processes, so each process opens its own
+        self.connection = None
+        self.pid = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> dict|None:
+        """
+        Look up a key in memory, then in the SQLite file, marking it as the most recently used entry
+
+        :param key: The key to look up
+        :return: The cached value, or None if the key is not cached or has expired
+        """
+        if self.maxsize <= 0:
+            return None
+
+        with self.lock:
+            now = time.time()
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                entry = self._disk_get(key, now)
+                if entry is None:
+                    self.misses += 1
+                    return None
+
+                # Entries larger than the whole cache are served from the SQLite file without being kept in memory
+                self.disk_hits += 1
+                self._remember(key, *entry)
+            else:
+                self.entries.move_to_end(key)
+
+            self.hits += 1
+
+            return json.loads(entry[1])
+
+    def put(self, key: str, value: dict) -> None:
+        """
+        Add or replace an entry, evicting the least recently used entries if the cache is over either limit
+
+        :param key: The key to store the value under
+        :param value: The JSON-friendly value to store
+        """
+        if self.maxsize <= 0:
+            return
+
+        data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        expires = time.time() + self.ttl
+
+        with self.lock:
+            self._remember(key, expires, data)
+            self._disk_put(key, expires, data)
+
+    def clear(self) -> None:
+        """
+        Remove every entry, from memory and the SQLite file, and reset the statistics
+        """
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            if self._connect() is not None:
+                with self.connection:
+                    self.connection.execute("DELETE FROM results")
+
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def stats(self) -> dict:
+        """
+        Return the cache statistics
+
+        :return: dict holding the hit (and SQLite hit), miss, eviction and expiration counts, the hit rate and the
+        current and maximum size in entries and bytes
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "maxbytes": self.maxbytes,
+            }
+
+    def _remember(self, key: str, expires: float, data: bytes) -> None:
+        """
+        Keep an encoded entry in memory. The lock must be held. Entries larger than the whole cache are only kept
+        in the SQLite file
+
+        :param key: The key to store the entry under
+        :param expires: The time the entry expires at
+        :param data: The encoded value
+        """
+        self._remove(key)
+        if len(data) > self.maxbytes:
+            return
+
+        self.entries[key] = (expires, data)
+        self.bytes += len(data)
+
+        while len(self.entries) > self.maxsize or self.bytes > self.maxbytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        """
+        Remove an entry from memory if it is there. The lock must be held
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def _connect(self):
+        """
+        Open the SQLite file for this process, creating its table the first time
+
+        :return: The connection, or None if entries are only kept in memory
+        """
+        if self.path is None:
+            return None
+
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self.pid = os.getpid()
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, expires REAL, value BLOB)")
+
+        return self.connection
+
+    def _disk_get(self, key: str, now: float) -> tuple[float, bytes]|None:
+        """
+        Read an entry from the SQLite file. The lock must be held
+
+        :param key: The key to look up
+        :param now: The current time, entries that expired by then are ignored
+        :return: The expiry time and encoded value of the entry, or None if it isn't stored or has expired
+        """
+        try:
+            if self._connect() is None:
+                return None
+
+            row = self.connection.execute("SELECT expires, value FROM results WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        except sqlite3.Error:
+            # A broken SQLite file only costs its hits, results are still computed and served
+            return None
+
+        return None if row is None else (row[0], bytes(row[1]))
+
+    def _disk_put(self, key: str, expires: float, data: bytes) -> None:
+        """
+        Write an entry to the SQLite file, removing expired entries and the oldest entries over `disk_size`. The lock
+        must be held
+        """
+        try:
+            if self._connect() is None:
+                return
+
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO results (key, expires, value) VALUES (?, ?, ?)", (key, expires, data))
+                self.connection.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+                self.connection.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_size,),
+                )
+        except sqlite3.Error:
+            return
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,399 @@
+import os
+import numpy as np
+from comparisons import normalize_rows
+from parameters import weights, weights_sum, matrix_methods, row_methods, normalized_fields
+
+# Precision packed vectors are stored in. Word vectors are float32 to begin with, so storing them as float64 would
+# only double the memory used per student
+dtype = np.float32
+
+# Cohort packs the vectors of many students into contiguous per-field blocks so whole groups of
+# students can be compared in a handful of batched numpy operations
+class Cohort:
+    def __init__(self, blocks: dict[str, np.ndarray[any]], present: dict[str, np.ndarray[any]], norms: dict[str, np.ndarray[any]]):
+        """
+        Initialize a cohort from already packed blocks
+
+        :param blocks: For each field, an (n, d) matrix holding one student per row (rows of missing fields are zero).
+        Rows of `normalized_fields` are unit length
+        :param present: For each field, an (n,) boolean mask that is true where the student has a value for the field
+        :param norms: For each of `normalized_fields`, the (n,) original length of every row
+        """
+        self.blocks = blocks
+        self.present = present
+        self.norms = norms
+
+    @classmethod
+    def from_students(cls, students: list[any]):
+        """
+        Pack a list of students into a cohort
+
+        :param students: The students to pack. Each student must provide a `to_vectors` method
+        :return: Cohort holding one row per student, in the same order
+        """
+        return cls.from_vectors([student.to_vectors(scaled=True) for student in students])
+
+    @classmethod
+    def from_vectors(cls, vectors: list[dict]):
+        """
+        Pack the vectors of many students into a cohort. Text vectors are normalized once here instead of on every
+        comparison
+
+        :param vectors: dict of vectors for each student (see `Student.vectorize`)
+        :return: Cohort holding one row per student, in the same order
+        """
+        blocks = {}
+        present = {}
+        norms = {}
+        for key in weights:
+            field = [v[key] for v in vectors]
+            width = max((len(f) for f in field), default=0)
+
+            # Empty fields stay as zero rows and are only tracked in the presence mask
+            block = np.zeros((len(field), width), dtype=dtype)
+            mask = np.zeros(len(field), dtype=bool)
+            for i, f in enumerate(field):
+                if len(f) > 0:
+                    block[i] = f
+                    mask[i] = True
+
+            if key in normalized_fields:
+                block, norms[key] = normalize_rows(block)
+
+            blocks[key] = block
+            present[key] = mask
+
+        return cls(blocks, present, norms)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.present.values()), []))
+
+    def vectors(self, row: int, scaled: bool = False) -> dict:
+        """
+        Return the vectors of one student as views into the packed blocks
+
+        :param row: The student's row
+        :param scaled: Return copies of the vectors of `normalized_fields` at their original length instead of unit length
+        :return: dict of vectors for the student, missing fields are empty
+        """
+        vectors = {key: block[row] if self.present[key][row] else block[row, :0] for key, block in self.blocks.items()}
+        if scaled:
+            for key, norms in self.norms.items():
+                vectors[key] = vectors[key] * norms[row]
+
+        return vectors
+
+    def take(self, indices: list[int]|slice):
+        """
+        Select students of this cohort by position
+
+        :param indices: The rows to select. A slice selects views of the rows instead of copies
+        :return: Cohort holding the selected rows, in the given order
+        """
+        return Cohort(
+            {key: block[indices] for key, block in self.blocks.items()},
+            {key: mask[indices] for key, mask in self.present.items()},
+            {key: norms[indices] for key, norms in self.norms.items()},
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write the cohort to a directory, one file per array
+
+        :param path: The directory to write the cohort to
+        """
+        os.makedirs(path, exist_ok=True)
+        for kind, arrays in (("blocks", self.blocks), ("present", self.present), ("norms", self.norms)):
+            for key, array in arrays.items():
+                np.save(os.path.join(path, f"{kind}.{key}.npy"), array)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Open a saved cohort without reading it into memory. Every process that opens the same directory shares a
+        single page-cache copy of the rows
+
+        :param path: The directory the cohort was saved to
+        :return: Cohort backed by read-only memory-mapped files
+        """
+        arrays = {"blocks": {}, "present": {}, "norms": {}}
+        for kind, loaded in arrays.items():
+            for key in weights:
+                file = os.path.join(path, f"{kind}.{key}.npy")
+                if os.path.exists(file):
+                    loaded[key] = np.load(file, mmap_mode="r")
+
+        return cls(arrays["blocks"], arrays["present"], arrays["norms"])
+
+    def resized(self, size: int, widths: dict[str, int]|None = None):
+        """
+        Copy this cohort into one with more rows, so students can be added later without copying every row again
+
+        :param size: The number of rows of the copy. Rows past the students of this cohort are empty
+        :param widths: The smallest width of each field in the copy, for fields that students to be added have and
+        that are missing in this whole cohort
+        :return: Cohort holding this cohort's students followed by empty rows
+        """
+        n = len(self)
+        widths = widths or {}
+
+        blocks = {}
+        for key, block in self.blocks.items():
+            blocks[key] = np.zeros((size, max(block.shape[1], widths.get(key, 0))), dtype=dtype)
+            blocks[key][:n, :block.shape[1]] = block
+
+        present = {key: np.zeros(size, dtype=bool) for key in self.present}
+        norms = {key: np.zeros(size, dtype=dtype) for key in self.norms}
+        for key in present:
+            present[key][:n] = self.present[key]
+        for key in norms:
+            norms[key][:n] = self.norms[key]
+
+        return Cohort(blocks, present, norms)
+
+    def put(self, start: int, other) -> None:
+        """
+        Write the students of another cohort into rows of this one, in place
+
+        :param start: The row the first student is written to
+        :param other: The cohort to copy. Its fields can't be wider than this cohort's (see `resized`)
+        """
+        rows = slice(start, start + len(other))
+        for key, block in other.blocks.items():
+            self.blocks[key][rows] = 0
+            self.blocks[key][rows, :block.shape[1]] = block
+            self.present[key][rows] = other.present[key]
+        for key, norms in other.norms.items():
+            self.norms[key][rows] = norms
+
+    def centroids(self, labels: np.ndarray[any], k: int, initial=None):
+        """
+        Start tracking the mean student of each of k clusters of this cohort
+
+        :param labels: The cluster of every student in this cohort, or -1 for students in no cluster
+        :param k: The number of clusters
+        :param initial: Cohort of k centers used for clusters that have no members
+        :return: Centroids of the clusters
+        """
+        return Centroids(self, labels, k, initial)
+
+    def similarity(self, other) -> np.ndarray[any]:
+        """
+        Compare every student in this cohort with every student in another cohort
+
+        The result matches `Student.compare_to` for every pair: fields that are missing on either
+        side contribute nothing to the sum, but their weight still counts towards `weights_sum`
+
+        :param other: The cohort to compare against
+        :return: (len(self), len(other)) matrix of scores (1 = more similar, -1 = less similar)
+        """
+        total = np.zeros((len(self), len(other)))
+
+        for key in weights:
+            a_present = self.present[key]
+            b_present = other.present[key]
+            if not a_present.any() or not b_present.any():
+                continue
+
+            # Missing rows are zero, their scores are masked out
+            scores = matrix_methods[key](self.blocks[key], other.blocks[key])
+            total += weights[key] * np.where(np.outer(a_present, b_present), scores, 0.0)
+
+        return total / weights_sum
+
+    def row_similarity(self, other) -> np.ndarray[any]:
+        """
+        Compare every student in this cohort with the student in the same row of another cohort, with the same
+        scores as `similarity`
+
+        :param other: The cohort to compare against, with as many students as this one
+        :return: (len(self),) vector of scores (1 = more similar, -1 = less similar)
+        """
+        total = np.zeros(len(self))
+
+        for key in weights:
+            present = self.present[key] & other.present[key]
+            if not present.any():
+                continue
+
+            scores = row_methods[key](self.blocks[key], other.blocks[key])
+            total += weights[key] * np.where(present, scores, 0.0)
+
+        return total / weights_sum
+
+# Centroids keeps the mean student of each cluster of a cohort as running per-field sums and counts, so
+# moving a student between clusters only touches the two affected clusters
+class Centroids:
+    def __init__(self, cohort: Cohort, labels: np.ndarray[any], k: int, initial: Cohort|None = None):
+        """
+        Compute the sums of every cluster from scratch
+
+        :param cohort: The cohort the clustered students belong to
+        :param labels: The cluster of every student in the cohort, or -1 for students in no cluster
+        :param k: The number of clusters
+        :param initial: Cohort of k centers used for clusters that have no members
+        """
+        self.cohort = cohort
+        self.k = k
+        self.labels = np.array(labels, dtype=np.int64)
+
+        # Sums and counts only include students that have a value for the field, so missing fields don't drag the mean to zero.
+        # Sums are kept in float64 so adding and removing students over many iterations doesn't accumulate rounding, and rows
+        # are converted before np.add.at, which is only fast when both sides have the same type. Unit rows are scaled back
+        # to their original length, so centers are the same means as before the vectors were normalized
+        assigned = self.labels >= 0
+        self.sums = {}
+        self.counts = {}
+        for key, block in cohort.blocks.items():
+            rows = assigned & cohort.present[key]
+            values = block[rows].astype(np.float64)
+            if key in cohort.norms:
+                values *= cohort.norms[key][rows, None]
+
+            self.sums[key] = np.zeros((k, block.shape[1]))
+            np.add.at(self.sums[key], self.labels[rows], values)
+            self.counts[key] = np.bincount(self.labels[rows], minlength=k)
+
+        self.sizes = np.bincount(self.labels[assigned], minlength=k)
+
+        # Cached means, only recomputed for clusters that changed since they were last read
+        if initial is None:
+            initial = Cohort(
+                {key: np.zeros((k, block.shape[1]), dtype=dtype) for key, block in cohort.blocks.items()},
+                {key: np.zeros(k, dtype=bool) for key in cohort.present},
+                {key: np.zeros(k, dtype=dtype) for key in cohort.norms},
+            )
+        self.means = Cohort(
+            {key: np.array(block, dtype=dtype) for key, block in initial.blocks.items()},
+            {key: np.array(mask) for key, mask in initial.present.items()},
+            {key: np.array(norms, dtype=dtype) for key, norms in initial.norms.items()},
+        )
+        self.dirty = set(range(k))
+
+    def move(self, row: int, cluster: int) -> None:
+        """
+        Move a student to another cluster, updating the sums of the old and new cluster
+
+        :param row: The student's row in the cohort
+        :param cluster: The cluster to move the student to, or -1 to remove it from its cluster
+        """
+        old = self.labels[row]
+        if old == cluster:
+            return
+
+        for key, block in self.cohort.blocks.items():
+            if not self.cohort.present[key][row]:
+                continue
+
+            value = block[row] * self.cohort.norms[key][row] if key in self.cohort.norms else block[row]
+            if old >= 0:
+                self.sums[key][old] -= value
+                self.counts[key][old] -= 1
+            if cluster >= 0:
+                self.sums[key][cluster] += value
+                self.counts[key][cluster] += 1
+
+        if old >= 0:
+            self.sizes[old] -= 1
+            self.dirty.add(old)
+        if cluster >= 0:
+            self.sizes[cluster] += 1
+            self.dirty.add(cluster)
+
+        self.labels[row] = cluster
+
+    def update(self, labels: np.ndarray[any]) -> int:
+        """
+        Bring the sums up to date with new cluster labels, moving only the students whose cluster changed
+
+        :param labels: The new cluster of every student in the cohort
+        :return: The number of students that moved
+        """
+        moved = np.flatnonzero(self.labels != labels)
+        for row in moved:
+            self.move(row, labels[row])
+
+        return len(moved)
+
+    def rebase(self, cohort: Cohort, rows: np.ndarray[any]|None = None) -> None:
+        """
+        Follow the clustered students to another cohort, for example one with rows added or with unused rows left out.
+        The sums don't change, so nothing is added up again
+
+        :param cohort: The cohort the students are now in. Its fields may be wider than before (see `Cohort.resized`)
+        :param rows: The previous row of every row of `cohort`, or -1 for students in no cluster. Defaults to the
+        previous rows followed by students in no cluster
+        """
+        if rows is None:
+            rows = np.arange(len(cohort))
+            rows[len(self.labels):] = -1
+
+        rows = np.asarray(rows, dtype=np.int64)
+        self.labels = np.where(rows >= 0, self.labels[np.maximum(rows, 0)], -1)
+        self.cohort = cohort
+
+        # Fields that were missing in the whole previous cohort start with zero sums
+        for key, block in cohort.blocks.items():
+            width = self.sums[key].shape[1]
+            if block.shape[1] > width:
+                sums = np.zeros((self.k, block.shape[1]))
+                sums[:, :width] = self.sums[key]
+                self.sums[key] = sums
+
+                means = np.zeros((self.k, block.shape[1]), dtype=dtype)
+                means[:, :width] = self.means.blocks[key]
+                self.means.blocks[key] = means
+
+    def relabel(self, positions: np.ndarray[any], k: int) -> None:
+        """
+        Renumber the clusters, for example after some were removed or added. Removed clusters must have no students
+        left, added clusters start empty
+
+        :param positions: The new number of every cluster, or -1 for clusters that were removed
+        :param k: The new number of clusters
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if k == self.k and np.array_equal(positions, np.arange(k)):
+            return
+
+        kept = np.flatnonzero(positions >= 0)
+        targets = positions[kept]
+
+        def renumber(values: np.ndarray[any]) -> np.ndarray[any]:
+            result = np.zeros((k,) + values.shape[1:], dtype=values.dtype)
+            result[targets] = values[kept]
+            return result
+
+        self.sums = {key: renumber(sums) for key, sums in self.sums.items()}
+        self.counts = {key: renumber(counts) for key, counts in self.counts.items()}
+        self.sizes = renumber(self.sizes)
+        self.means = Cohort(
+            {key: renumber(block) for key, block in self.means.blocks.items()},
+            {key: renumber(mask) for key, mask in self.means.present.items()},
+            {key: renumber(norms) for key, norms in self.means.norms.items()},
+        )
+
+        self.labels = np.where(self.labels >= 0, positions[np.maximum(self.labels, 0)], -1)
+        self.dirty = set(positions[i] for i in self.dirty if positions[i] >= 0) | (set(range(k)) - set(targets.tolist()))
+        self.k = k
+
+    def to_cohort(self) -> Cohort:
+        """
+        Return the mean student of every cluster. Clusters without members keep their previous center
+
+        :return: Cohort holding one center per cluster
+        """
+        dirty = [i for i in self.dirty if self.sizes[i] > 0]
+        if dirty:
+            for key in self.sums:
+                counts = self.counts[key][dirty]
+                present = counts > 0
+                means = self.sums[key][dirty] / np.maximum(counts, 1)[:, None]
+                if key in self.means.norms:
+                    means, self.means.norms[key][dirty] = normalize_rows(means)
+
+                self.means.blocks[key][dirty] = means
+                self.means.present[key][dirty] = present
+
+        self.dirty = set(i for i in self.dirty if self.sizes[i] == 0)
+        return self.means
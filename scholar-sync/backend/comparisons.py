@@ -17,11 +17,36 @@ def text_comparison(a: np.ndarray[any], b: np.ndarray[any]) -> float:
     :param b: The second vector to compare
     :return: float representation of how close the two values are (1 = more similar, -1 = less similar)
     """
-    a_hat = a / sum([v**2 for v in a])**0.5
-    b_hat = b / sum([v**2 for v in b])**0.5
+    # Three dot products give the same cosine as normalizing both vectors first, without building the normalized copies
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
 
+    return float(np.dot(a, b) / np.sqrt(np.dot(a, a) * np.dot(b, b)))
+
+def unit_text_comparison(a_hat: np.ndarray[any], b_hat: np.ndarray[any]) -> float:
+    """
+    Version of `text_comparison` for vectors that are already unit length (see `normalize_rows`), where the
+    closeness is just the dot product
+
+    :param a_hat: The first unit vector to compare
+    :param b_hat: The second unit vector to compare
+    :return: float representation of how close the two values are (1 = more similar, -1 = less similar)
+    """
     return float(np.dot(a_hat, b_hat))
 
+def normalize_rows(block: np.ndarray[any]) -> tuple[np.ndarray[any], np.ndarray[any]]:
+    """
+    Scale every row of a matrix to unit length, so cosine closeness becomes a plain dot product. Rows of zeros
+    (missing values) stay zero
+
+    :param block: (n, d) matrix of vectors
+    :return: (n, d) matrix of unit rows in the type of `block`, and the (n,) length of every original row
+    """
+    norms = np.sqrt(np.einsum("ij,ij->i", block, block, dtype=np.float64))
+    unit = block / np.where(norms > 0, norms, 1.0)[:, None]
+
+    return unit.astype(block.dtype, copy=False), norms.astype(block.dtype)
+
 def enum_comparison(n: int):
     """
     Have value A and value B that are represented as numerical values. This can
@@ -45,3 +70,51 @@ def enum_comparison(n: int):
         return float(1 - 2.0*abs(a[0]-b[0]) / (n - 1))
 
     return compare
+
+def unit_text_comparison_matrix(a_hat: np.ndarray[any], b_hat: np.ndarray[any]) -> np.ndarray[any]:
+    """
+    Compare every row of matrix A with every row of matrix B using the same cosine closeness as
+    `text_comparison`. Rows are already unit length (see `normalize_rows`), so the whole comparison is a single
+    matrix product
+
+    :param a_hat: (n, d) matrix of unit vectors to compare
+    :param b_hat: (m, d) matrix of unit vectors to compare
+    :return: (n, m) matrix of closeness scores (1 = more similar, -1 = less similar)
+    """
+    return a_hat @ b_hat.T
+
+def unit_text_comparison_rows(a_hat: np.ndarray[any], b_hat: np.ndarray[any]) -> np.ndarray[any]:
+    """
+    Row by row version of `unit_text_comparison_matrix`, comparing every row of A only with the same row of B
+
+    :param a_hat: (n, d) matrix of unit vectors to compare
+    :param b_hat: (n, d) matrix of unit vectors to compare
+    :return: (n,) vector of closeness scores (1 = more similar, -1 = less similar)
+    """
+    return np.einsum("ij,ij->i", a_hat, b_hat)
+
+def enum_comparison_matrix(n: int):
+    """
+    Matrix version of `enum_comparison`. The returned function compares the
+    first column of every row of A with the first column of every row of B.
+
+    :param n: The range of the values (max_val - min_val of range)
+    :return: function mapping an (n, 1) and an (m, 1) matrix to an (n, m) matrix of closeness scores
+    """
+    def compare(a: np.ndarray[any], b: np.ndarray[any]) -> np.ndarray[any]:
+        return 1 - 2.0*np.abs(a[:, :1] - b[:, :1].T) / (n - 1)
+
+    return compare
+
+def enum_comparison_rows(n: int):
+    """
+    Row by row version of `enum_comparison_matrix`. The returned function compares the first column of every row
+    of A with the first column of the same row of B.
+
+    :param n: The range of the values (max_val - min_val of range)
+    :return: function mapping two (n, 1) matrices to an (n,) vector of closeness scores
+    """
+    def compare(a: np.ndarray[any], b: np.ndarray[any]) -> np.ndarray[any]:
+        return 1 - 2.0*np.abs(a[:, 0] - b[:, 0]) / (n - 1)
+
+    return compare
@@ -0,0 +1,129 @@
+import os
+import sys
+import numpy as np
+
+# File names used inside a converted store directory
+vectors_file = "vectors.npy"
+vocab_file = "vocab.npy"
+order_file = "order.npy"
+
+# Longest word, in utf-8 bytes, kept in a store's vocabulary. The vocabulary is a fixed-width array as wide as its
+# longest word, and the few long phrase tokens of a word2vec file would otherwise widen every entry. Answers are split
+# into plain words before lookup (see `utils.tokenize`), which are far shorter than this
+max_word_bytes = 40
+
+# VectorStore holds word vectors as a raw float32 matrix and a sorted vocabulary, both memory-mapped
+# from disk. Every process that opens the same store shares a single page-cache copy of the data
+class VectorStore:
+    def __init__(self, vectors: np.ndarray[any], vocab: np.ndarray[any], order: np.ndarray[any]):
+        """
+        Initialize a store from its three arrays
+
+        :param vectors: (n, d) float32 matrix with one word vector per row
+        :param vocab: (m,) sorted array of utf-8 encoded words, m <= n
+        :param order: (m,) array mapping each position in `vocab` to its row in `vectors`
+        """
+        self.vectors = vectors
+        self.vocab = vocab
+        self.order = order
+
+        self.vector_size = vectors.shape[1]
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Open a converted store without reading it into memory
+
+        :param path: The directory the store was saved to
+        :return: VectorStore backed by memory-mapped files
+        """
+        vectors = np.load(os.path.join(path, vectors_file), mmap_mode="r")
+        vocab = np.load(os.path.join(path, vocab_file), mmap_mode="r")
+        order = np.load(os.path.join(path, order_file), mmap_mode="r")
+
+        return cls(vectors, vocab, order)
+
+    @staticmethod
+    def save(path: str, words: list[str], vectors: np.ndarray[any]) -> None:
+        """
+        Write words and their vectors to a store directory. Words longer than `max_word_bytes` keep their row but are
+        left out of the vocabulary, so they can't be looked up
+
+        :param path: The directory to write the store to
+        :param words: The vocabulary, in the same order as the rows of `vectors`
+        :param vectors: (n, d) matrix of word vectors
+        """
+        os.makedirs(path, exist_ok=True)
+
+        encoded = [word.encode("utf-8") for word in words]
+        rows = np.array([row for row, word in enumerate(encoded) if len(word) <= max_word_bytes], dtype=np.int64)
+        kept = np.array([encoded[row] for row in rows], dtype="S")
+        order = np.argsort(kept, kind="stable")
+
+        np.save(os.path.join(path, vectors_file), np.asarray(vectors, dtype=np.float32))
+        np.save(os.path.join(path, vocab_file), kept[order])
+        np.save(os.path.join(path, order_file), rows[order])
+
+    @staticmethod
+    def convert(source: str, path: str) -> None:
+        """
+        Convert a word2vec binary file into a store directory. This only has to be done once per model
+
+        :param source: The word2vec file to convert (e.g. `word2vec-google-news-300.gz`)
+        :param path: The directory to write the store to
+        """
+        from gensim.models import KeyedVectors
+
+        model = KeyedVectors.load_word2vec_format(source, binary=True)
+        VectorStore.save(path, model.index_to_key, model.vectors)
+
+    def index(self, word: str) -> int:
+        """
+        Find the row of a word in the vector matrix
+
+        :param word: The word to look up
+        :return: The row of the word, or -1 if the word is not in the store
+        """
+        key = word.encode("utf-8")
+        i = int(np.searchsorted(self.vocab, key))
+        if i < len(self.vocab) and self.vocab[i] == key:
+            return int(self.order[i])
+
+        return -1
+
+    def lookup(self, words: list[str]) -> np.ndarray[any]:
+        """
+        Find the rows of many words in the vector matrix with one vectorized search
+
+        :param words: The words to look up
+        :return: (len(words),) array holding the row of each word, or -1 where a word is not in the store
+        """
+        if len(words) == 0 or len(self.vocab) == 0:
+            return np.full(len(words), -1, dtype=np.int64)
+
+        keys = np.array([word.encode("utf-8") for word in words])
+        positions = np.minimum(np.searchsorted(self.vocab, keys), len(self.vocab) - 1)
+        found = self.vocab[positions] == keys
+
+        return np.where(found, self.order[positions], -1)
+
+    def __contains__(self, word: str) -> bool:
+        return self.index(word) >= 0
+
+    def __getitem__(self, word: str) -> np.ndarray[any]:
+        i = self.index(word)
+        if i < 0:
+            raise KeyError(word)
+
+        return self.vectors[i]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python embeddings.py <word2vec file> <store directory>")
+        sys.exit(1)
+
+    VectorStore.convert(sys.argv[1], sys.argv[2])
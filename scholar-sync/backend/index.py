@@ -0,0 +1,79 @@
+import numpy as np
+
+# CenterIndex narrows down which centers each student has to be compared with. Centers are grouped into cells around
+# a few cell means, every student is only compared exactly with the centers in the cells whose means are most similar
+# to it, and each cell is scored as one batched comparison. Centers that move are placed in their nearest cell without
+# building the cells again, until the centers have drifted too far from the cell means
+class CenterIndex:
+    def __init__(self, centers, n_cells: int, iterations: int = 5, seed: int = 0, drift: float = 0.2):
+        """
+        Group centers into cells with a few rounds of k-means over the centers themselves
+
+        :param centers: The packed centers (see `cohort.Cohort`)
+        :param n_cells: The number of cells
+        :param iterations: The number of k-means rounds used to build the cells
+        :param seed: Seed for the first cell means
+        :param drift: The share the average distance from the centers to their cell means may grow by after the cells
+        are built before the index is stale (see `stale`)
+        """
+        rng = np.random.default_rng(seed)
+        n_cells = max(1, min(n_cells, len(centers)))
+
+        cells = centers.take(rng.choice(len(centers), size=n_cells, replace=False))
+        for _ in range(iterations):
+            labels = np.argmax(centers.similarity(cells), axis=1)
+            cells = centers.centroids(labels, n_cells, initial=cells).to_cohort()
+
+        self.cells = cells
+        self.labels = labels
+        self.drift = drift
+
+        # Distance from every center to the mean of its cell, and their average when the cells were built
+        self.distances = (1 - centers.similarity(cells)[np.arange(len(labels)), labels])/2.0
+        self.spread = float(self.distances.mean())
+
+        # Number of center to cell comparisons made by the last build or update
+        self.comparisons = len(centers) * n_cells * (iterations + 1)
+        self.members = [np.flatnonzero(labels == cell) for cell in range(n_cells)]
+
+    def update(self, centers, moved: list[int]) -> None:
+        """
+        Place centers that moved in their nearest cell. The cell means stay where they were built
+
+        :param centers: The packed centers, including the ones that didn't move
+        :param moved: The positions of the centers that moved
+        """
+        self.comparisons = len(moved) * len(self.members)
+        if len(moved) == 0:
+            return
+
+        scores = centers.take(moved).similarity(self.cells)
+        self.labels[moved] = np.argmax(scores, axis=1)
+        self.distances[moved] = (1 - scores.max(axis=1))/2.0
+        self.members = [np.flatnonzero(self.labels == cell) for cell in range(len(self.members))]
+
+    def stale(self) -> bool:
+        """
+        Check whether the centers drifted so far from the cell means that the cells should be built again
+
+        :return: True once the average distance from the centers to their cell means grew by more than `drift`
+        """
+        return float(self.distances.mean()) > (1 + self.drift) * self.spread
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def search(self, cohort, probes: int) -> np.ndarray[any]:
+        """
+        Find the cells every student should be compared with
+
+        :param cohort: The packed students (see `cohort.Cohort`)
+        :param probes: The number of cells searched per student. More cells find the nearest center more often but cost more
+        :return: (len(cohort), probes) matrix holding the cells searched for every student
+        """
+        scores = cohort.similarity(self.cells)
+        probes = min(probes, scores.shape[1])
+        if probes == scores.shape[1]:
+            return np.tile(np.arange(probes), (len(scores), 1))
+
+        return np.argpartition(-scores, probes - 1, axis=1)[:, :probes]
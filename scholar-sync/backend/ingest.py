@@ -0,0 +1,173 @@
+import asyncio
+import codecs
+import csv
+import json
+from pydantic import ValidationError
+from student import StudentModel, Student
+
+# Number of rows vectorized together while a cohort is being uploaded
+batch_size = 256
+
+# Labels used by survey CSVs for each enum field, in the order of the enum's values
+csv_labels = {
+    "high_school": ["In-State", "Out-of-state"],
+    "lead_conversation": ["Strongly Agree", "Agree", "Neutral", "Disagree", "Strongly Disagree"],
+    "frequency": ["low", "medium", "high"],
+}
+
+# CsvParser turns CSV lines into dicts keyed on the header row, one record at a time
+class CsvParser:
+    def __init__(self):
+        """
+        Initialize a parser that expects the header row first
+        """
+        self.header = None
+        self.pending = []
+
+    def feed(self, line: str) -> dict|None:
+        """
+        Add one line of the CSV
+
+        :param line: The line, without its line break
+        :raises ValueError: if the record is malformed or doesn't have one value per header column
+        :return: The record completed by this line, or None if the line was the header, was blank or ended inside a quoted value
+        """
+        # Quoted values can span lines, so keep the lines of a record until the csv module can read all of it
+        self.pending.append(line + "\n")
+        try:
+            rows = list(csv.reader(self.pending, strict=True))
+        except csv.Error as e:
+            if str(e) == "unexpected end of data":
+                return None
+            self.pending = []
+            raise ValueError(f"malformed row: {e}")
+
+        self.pending = []
+        if len(rows) == 0 or "".join(rows[0]).strip() == "":
+            return None
+
+        values = rows[0]
+        if self.header is None:
+            self.header = [value.strip() for value in values]
+            return None
+
+        if len(values) != len(self.header):
+            raise ValueError(f"expected {len(self.header)} values, got {len(values)}")
+
+        return dict(zip(self.header, values))
+
+def csv_to_fields(record: dict) -> dict:
+    """
+    Convert the raw strings of a CSV record into StudentModel fields, the same way the frontend does
+
+    :param record: The CSV record
+    :return: dict of fields for a StudentModel
+    """
+    fields = dict(record)
+
+    limit = fields.get("mentee_limit", "")
+    fields["mentee_limit"] = None if limit in ["", "null"] else limit
+
+    for key, labels in csv_labels.items():
+        value = fields.get(key, "")
+        if value in labels:
+            fields[key] = labels.index(value)
+        elif value.isdigit():
+            fields[key] = int(value)
+        else:
+            fields[key] = None
+
+    return fields
+
+def parse_row(line: str, parser: CsvParser|None) -> StudentModel|None:
+    """
+    Parse and validate one line of an upload
+
+    :param line: The line to parse
+    :param parser: The CSV parser for CSV uploads, or None for NDJSON uploads
+    :raises ValueError: if the row is malformed or not a valid StudentModel
+    :return: The row's StudentModel, or None if the line didn't complete a row
+    """
+    if parser is None:
+        if line.strip() == "":
+            return None
+        return StudentModel.model_validate(json.loads(line))
+
+    record = parser.feed(line)
+    if record is None:
+        return None
+    return StudentModel.model_validate(csv_to_fields(record))
+
+def describe_error(e: Exception) -> str:
+    """
+    Describe why a row was rejected in a short, readable way
+
+    :param e: The error raised for the row
+    :return: description of the error
+    """
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+
+    return str(e)
+
+async def ingest(chunks, format: str) -> tuple[list[Student], list[dict], int]:
+    """
+    Parse, validate and vectorize a streamed cohort. Rows are vectorized in batches on a worker thread while the
+    rest of the upload is still being read, and only the resulting students are kept
+
+    :param chunks: Async iterator over the raw bytes of the upload
+    :param format: Either "csv" or "ndjson"
+    :return: The valid students, the errors of invalid rows and the number of rows read
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = CsvParser() if format == "csv" else None
+
+    students = []
+    errors = []
+    rows = 0
+
+    batch = []
+    vectorizing = None
+
+    async def flush():
+        nonlocal batch, vectorizing
+
+        # Wait for the previous batch so students stay in upload order, then start on this one
+        if vectorizing is not None:
+            students.extend(await vectorizing)
+        vectorizing = asyncio.ensure_future(asyncio.to_thread(Student.from_models, batch)) if batch else None
+        batch = []
+
+    def read(lines: list[str]):
+        nonlocal rows
+        for line in lines:
+            try:
+                model = parse_row(line.rstrip("\r"), parser)
+            except (ValueError, csv.Error) as e:
+                rows += 1
+                errors.append({"row": rows, "error": describe_error(e)})
+                continue
+
+            if model is not None:
+                rows += 1
+                batch.append(model)
+
+    # Split the upload into lines as it arrives
+    text = ""
+    async for chunk in chunks:
+        text += decoder.decode(chunk)
+        *lines, text = text.split("\n")
+        read(lines)
+
+        if len(batch) >= batch_size:
+            await flush()
+
+    read([text + decoder.decode(b"", final=True)])
+    if parser is not None and len(parser.pending) > 0:
+        rows += 1
+        errors.append({"row": rows, "error": "unterminated quoted value"})
+
+    await flush()
+    await flush()
+
+    return students, errors, rows
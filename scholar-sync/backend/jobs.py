@@ -0,0 +1,214 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import utils
+
+# QueueFullError is raised when a job is submitted while the queue is at its maximum depth
+class QueueFullError(Exception):
+    pass
+
+# Job tracks one submitted piece of work and its outcome
+class Job:
+    def __init__(self, future: Future):
+        """
+        Initialize a job for a submitted future
+
+        :param future: The future the job's work runs in
+        """
+        self.id = uuid.uuid4().hex
+        self.future = future
+
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def status(self) -> str:
+        """
+        The status of the job: queued, running, done, failed or cancelled
+        """
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        if self.future.cancelled():
+            return "cancelled"
+
+        return "failed" if self.future.exception() is not None else "done"
+
+    def to_dict(self) -> dict:
+        """
+        Return the job as a JSON-friendly dict, including its result or error once finished
+
+        :return: dict describing the job
+        """
+        job = {"id": self.id, "status": self.status, "created": self.created, "finished": self.finished}
+
+        if job["status"] == "done":
+            job["result"] = self.future.result()
+        elif job["status"] == "failed":
+            job["error"] = str(self.future.exception())
+
+        return job
+
+# Start method of the worker processes. Forking the serving process could copy a lock held by one of its request
+# threads (such as a cache's) into a worker where nothing ever releases it, so workers start from a clean process
+start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def start_worker() -> None:
+    """
+    Load the embedding model when a worker process starts, so its first job doesn't wait for it. The model is
+    memory-mapped, so every worker shares its pages. A model that fails to load is reported by the jobs that need it
+    """
+    try:
+        utils.load_model()
+    except Exception:
+        pass
+
+# JobQueue runs jobs in a bounded pool of worker processes
+class JobQueue:
+    def __init__(self, workers: int, depth: int, history: int = 1000, initializer=None):
+        """
+        Initialize an empty queue. The worker processes are only started when the first job is submitted
+
+        :param workers: The number of worker processes
+        :param depth: The maximum number of queued and running jobs
+        :param history: The maximum number of finished jobs to keep results for
+        :param initializer: Function run once in every worker process when it starts. It must be picklable
+        """
+        self.workers = workers
+        self.depth = depth
+        self.history = history
+        self.initializer = initializer
+
+        self.executor = None
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Job:
+        """
+        Run a function in a worker process
+
+        :param fn: The function to run. It and its arguments must be picklable
+        :raises QueueFullError: if the queue already holds `depth` unfinished jobs
+        :return: The job tracking the function
+        """
+        with self.lock:
+            if self.pending >= self.depth:
+                raise QueueFullError(f"the job queue is full ({self.depth} jobs)")
+
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(start_method), initializer=self.initializer)
+
+            job = Job(self.executor.submit(fn, *args, **kwargs))
+            self.jobs[job.id] = job
+            self.pending += 1
+
+        job.future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def _finish(self, job: Job) -> None:
+        """
+        Record that a job finished and forget the oldest finished jobs beyond `history`
+
+        :param job: The job that finished
+        """
+        with self.lock:
+            job.finished = time.time()
+            self.pending -= 1
+
+            finished = [id for id, j in self.jobs.items() if j.finished is not None]
+            for id in finished[:max(0, len(finished) - self.history)]:
+                del self.jobs[id]
+
+    def get(self, id: str) -> Job|None:
+        """
+        Find a job by its id
+
+        :param id: The id of the job
+        :return: The job, or None if it is unknown or was forgotten
+        """
+        with self.lock:
+            return self.jobs.get(id)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes, cancelling jobs that haven't started
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+# Queue used by the API. Its size can be configured through the environment
+queue = JobQueue(
+    workers=int(os.environ.get("JOB_WORKERS", os.cpu_count() or 1)),
+    depth=int(os.environ.get("JOB_QUEUE_DEPTH", 16)),
+    initializer=start_worker,
+)
+
+# Pool that requests split their own work over, such as the restarts of a fit or the cohorts of a batch. It is kept
+# apart from the job queue, so a request never waits behind queued jobs. It is started on first use and lives as long
+# as the process, so requests don't pay for starting workers
+pool_workers = int(os.environ.get("POOL_WORKERS", os.cpu_count() or 1))
+pool = None
+pool_lock = threading.Lock()
+
+def shared_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared worker pool, starting it the first time. Its workers start like the job queue's
+
+    :return: The pool
+    """
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ProcessPoolExecutor(pool_workers, mp_context=multiprocessing.get_context(start_method), initializer=start_worker)
+
+        return pool
+
+def run_parallel(fn, tasks: list, n_jobs: int) -> list:
+    """
+    Run a function over tasks in the shared pool, keeping at most `n_jobs` of them running at once. Tasks start in the
+    order they are given
+
+    :param fn: The function to run on every task. It and the tasks must be picklable
+    :param tasks: The tasks
+    :param n_jobs: The largest number of tasks running at once
+    :return: The result of every task, in the same order
+    """
+    executor = shared_pool()
+    results = [None] * len(tasks)
+    pending = iter(enumerate(tasks))
+    running = {}
+
+    try:
+        for i, task in itertools.islice(pending, max(1, n_jobs)):
+            running[executor.submit(fn, task)] = i
+
+        while len(running) > 0:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+                for i, task in itertools.islice(pending, 1):
+                    running[executor.submit(fn, task)] = i
+    finally:
+        # A failed task fails the whole run, so tasks that haven't started are dropped
+        for future in running:
+            future.cancel()
+
+    return results
+
+def shutdown_pool() -> None:
+    """
+    Stop the shared worker pool, cancelling tasks that haven't started
+    """
+    global pool
+    with pool_lock:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = None
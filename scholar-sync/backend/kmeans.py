@@ -1,16 +1,56 @@
 import numpy as np
-from collections import defaultdict
 from typing import List
+import heapq
+import itertools
 import math
+import tempfile
+import time
+from index import CenterIndex
+from metrics import timed, timer
+
+# Smallest gain that counts as an improvement, so rounding noise can't make objects swap back and forth
+min_gain = 1e-9
+
+# Objects whose best swap targets are picked together while optimizing. Only this many rows of partitioned gains
+# are held at once
+swap_block = 1024
+
+# Clusters each object is offered when looking for swaps: the ones it gains the most by moving to. With a center
+# index, clusters outside the searched cells can't gain anything, so they are never offered
+swap_targets = 16
+
+def restart_worker(task: tuple) -> List[dict]:
+    """
+    Run restarts of a shared fit in a worker process (see `KMeansVariation._share`)
+
+    :param task: What the fit shares and the seeds of the restarts to run
+    :return: result of every restart that ran (see `KMeansVariation._restart`). Restarts that haven't started by the
+    deadline are skipped, the first one always runs
+    """
+    shared, seeds = task
+    model = KMeansVariation._from_shared(shared)
+
+    restarts = []
+    for seed in seeds:
+        if len(restarts) > 0 and model._past_deadline():
+            break
+        restarts.append(model._restart(seed))
+
+    return restarts
 
 # Object is a wrapper class used in k-means operations
 class Object:
+    # One object is created per item being clustered, so they don't carry a per-instance __dict__
+    __slots__ = ("value", "nearest_distance", "nearest_center_index", "index", "removed_centers")
+
     def __init__(self, value):
         """
         Initialize an object with an encapsulated value
         
         - This value must contain a `compare_to` method which returns a float and compares another variable of type `value` with itself
         - This value must contain a `average_with` method which returns an average variable of type `value` of the two provided values
+        - This value may contain a `similarity_matrix` classmethod which compares two lists of values at once. It is used instead of `compare_to` when present
+        - This value may contain a `pack` classmethod which packs a list of values into a collection providing `similarity`, `take` and `centroids` (see `cohort.Cohort`). When present, centers are kept as running sums instead of calling `average_with`. Restarts only run in other processes when the collection also provides `save` and `load`
         """
         self.value = value
 
@@ -20,8 +60,11 @@ class Object:
         # The index of the nearest center point compared to this object
         self.nearest_center_index = None
 
-        # Center points that this object cannot belong to (as they are already full)
-        self.removed_centers = []
+        # The row of this object in the cached distance matrix
+        self.index = None
+
+        # Mask of center points that this object cannot belong to (as they are already full)
+        self.removed_centers = None
 
     def compare_to(self, obj) -> float:
         """
@@ -33,6 +76,23 @@ class Object:
         """
         return (1 - self.value.compare_to(obj.value))/2.0
 
+    @staticmethod
+    def distance_matrix(objects, others):
+        """
+        Compare every object in one list to every object in another list
+
+        Uses the encapsulated value's `similarity_matrix` when available and falls back to `compare_to` otherwise
+
+        :param objects: The objects to compare (rows of the result)
+        :param others: The objects to compare them to (columns of the result)
+        :return: matrix of distances between [0, 1]
+        """
+        if len(objects) > 0 and hasattr(type(objects[0].value), "similarity_matrix"):
+            similarity = type(objects[0].value).similarity_matrix([obj.value for obj in objects], [obj.value for obj in others])
+            return (1 - similarity)/2.0
+
+        return np.array([[obj.compare_to(other) for other in others] for obj in objects]).reshape(len(objects), len(others))
+
     def average_with(self, objects):
         """
         Find the average of this object with another object by delegating to the encapsulated value
@@ -40,7 +100,7 @@ class Object:
         average_value = self.value.average_with([obj.value for obj in objects])
         return Object(average_value)
 
-# Heap provides a basic heap implementation as a priority queue
+# Heap provides a binary heap implementation as a priority queue
 class Heap:
     def __init__(self):
         """
@@ -48,21 +108,16 @@ class Heap:
         """
         self.array = []
 
+        # Insertion counter used to break ties, so objects with equal distances are popped in insertion order
+        self.counter = itertools.count()
+
     def append(self, obj: Object) -> None:
         """
         Put an item into the heap based on its `nearest_distance` attribute
 
         :param obj: The item to add to the heap
         """
-        index = 0
-
-        for i in range(len(self.array)):
-            if self.array[i].nearest_distance > obj.nearest_distance:
-                index = i
-                break
-            index = index + 1
-
-        self.array.insert(index, obj)
+        heapq.heappush(self.array, (obj.nearest_distance, next(self.counter), obj))
 
     def pop(self) -> Object:
         """
@@ -70,7 +125,7 @@ class Heap:
 
         :return: Next item from the heap with the smallest `nearest_distance` attribute
         """
-        return self.array.pop(0)
+        return heapq.heappop(self.array)[2]
 
     def isEmpty(self) -> bool:
         """
@@ -80,24 +135,168 @@ class Heap:
         """
         return len(self.array) == 0
 
-        
+# Checkpoint keeps what a fit of packable values leaves behind: the packed members, the running sums of the clusters
+# and the distance from every member to its cluster's center. A later `refit` starting from it only packs the new
+# members and only compares what changed
+class Checkpoint:
+    def __init__(self, packed, values: List[any], centroids, distances: np.ndarray[any]|None = None):
+        """
+        Initialize a checkpoint
+
+        :param packed: The packed members, one row per value. It can have spare rows at the end
+        :param values: The value in every row, or None for rows no longer in use
+        :param centroids: Centroids of the clusters over the rows in use (see `cohort.Centroids`)
+        :param distances: The distance from every row to the center of its cluster, infinite for rows in no cluster.
+        Computed from `centroids` if not given
+        """
+        self.packed = packed
+        self.values = list(values)
+        self.rows = {id(value): row for row, value in enumerate(self.values) if value is not None}
+        self.centroids = centroids
+
+        if distances is None:
+            centers = centroids.to_cohort()
+            labels = centroids.labels
+            distances = (1 - self.cohort().row_similarity(centers.take(np.maximum(labels, 0))))/2.0
+            distances[labels < 0] = math.inf
+        self.distances = distances
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def cohort(self):
+        """
+        Return the packed rows in use
+
+        :return: Packed rows, as views of the checkpoint's rows
+        """
+        return self.packed.take(slice(0, len(self.values)))
+
+    def place(self, values: List[any]) -> np.ndarray[any]:
+        """
+        Find the row of every value, packing the values that aren't in the checkpoint into new rows. Rows of values
+        that aren't given are taken out of their cluster and no longer used
+
+        :param values: The values to place
+        :return: The row of every value, in the same order
+        """
+        kept = set(id(value) for value in values)
+        for row, value in enumerate(self.values):
+            if value is not None and id(value) not in kept:
+                self.centroids.move(row, -1)
+                self.values[row] = None
+                del self.rows[id(value)]
+
+        # Unused rows are left out once they outnumber the rows in use
+        if len(self.values) > 2 * len(self.rows):
+            self._compact()
+
+        added = [value for value in values if id(value) not in self.rows]
+        if len(added) > 0:
+            self._add(added)
+
+        return np.fromiter((self.rows[id(value)] for value in values), dtype=np.int64, count=len(values))
+
+    def _add(self, values: List[any]) -> None:
+        """
+        Pack values into the spare rows, copying the packed rows into a larger buffer when there aren't enough. Rows
+        in use are never written to, so views of them stay valid
+
+        :param values: The values to add
+        """
+        cohort = type(values[0]).pack(values)
+        size = len(self.values)
+        needed = size + len(cohort)
+
+        widths = {key: block.shape[1] for key, block in cohort.blocks.items()}
+        wider = any(width > self.packed.blocks[key].shape[1] for key, width in widths.items())
+        if needed > len(self.packed) or wider:
+            capacity = max(needed, 2 * len(self.values)) if needed > len(self.packed) else len(self.packed)
+            self.packed = self.cohort().resized(capacity, widths)
+
+        self.packed.put(size, cohort)
+        for value in values:
+            self.rows[id(value)] = len(self.values)
+            self.values.append(value)
+
+        self.centroids.rebase(self.cohort())
+        self.distances = np.concatenate([self.distances, np.full(len(values), math.inf)])
+
+    def _compact(self) -> None:
+        """
+        Copy the rows in use into a new buffer, leaving out the unused rows
+        """
+        rows = np.flatnonzero([value is not None for value in self.values])
+        self.packed = self.packed.take(rows)
+        self.values = [self.values[row] for row in rows]
+        self.rows = {id(value): row for row, value in enumerate(self.values)}
+        self.centroids.rebase(self.packed, rows)
+        self.distances = self.distances[rows]
 
 # KMeansVariation class handles performing k-means clustering with clusters of constant sizes and
 # customly defined "distance" functions
 class KMeansVariation:
-    def __init__(self, k: int, max_iter: int = 100, clusters:List[List[Object]]|None = None):
+    def __init__(self, k: int, max_iter: int = 100, clusters:List[List[Object]]|None = None, seed: int|np.random.Generator|None = None, n_candidates: int = 1, n_init: int = 1, n_jobs: int = 1, probes: int|None = None, time_budget_ms: float|None = None, tol: float = 0.0):
         """
         Initialize the KMeansVariation
 
         :param k: The number of clusters to use when grouping objects 
         :param max_iter: The maximum number of iterations to use when optimizing the cluster
+        :param clusters: Objects each cluster starts with
+        :param seed: Seed or random generator used for k-means++, so fits can be reproduced
+        :param n_candidates: The number of candidate centers sampled at each k-means++ step. With more than one candidate the
+        candidate that lowers the total distance to the nearest center the most is kept (greedy k-means++)
+        :param n_init: The number of independent restarts to run. The restart with the lowest total distance is kept
+        :param n_jobs: The number of processes to run restarts in
+        :param probes: The number of index cells searched for the nearest centers of each object. Centers are grouped into
+        about sqrt(k) cells, so fewer probes compare fewer pairs but miss the nearest center more often. None compares every
+        object with every center. Only used when the values support packing
+        :param time_budget_ms: The milliseconds a fit may take. Once they are spent, seeding picks its remaining centers at
+        random, no further iterations or restarts start and the best clusters found so far are returned. The first
+        assignment always runs, so a fit can take longer than this by about one iteration. None never stops early
+        :param tol: Stop once an iteration lowers the total distance by less than this share of it. 0 never stops early
         """
         self.k = k
         self.max_iter = max_iter
+        self.rng = np.random.default_rng(seed)
+        self.n_candidates = n_candidates
+        self.n_init = n_init
+        self.n_jobs = n_jobs
+        self.probes = probes
+        self.time_budget_ms = time_budget_ms
+        self.tol = tol
+
+        # Time (in `time.monotonic` seconds, which worker processes share) the fit has to finish by
+        self.deadline = None
+
+        # Why the kept restart stopped iterating: converged, tolerance, deadline or max_iter
+        self.stopped = None
+
+        # Total distance from every object to its cluster's center after the fit, and the result of every restart
+        self.objective = None
+        self.restarts = []
 
         self.centers = []
 
+        # Cached distances from every cluster member to every center, recomputed once per iteration
+        self.distances = None
+
+        # Packed cluster members and the running sums of each cluster, used when the values support packing
+        self.packed = None
+        self.centroids = None
+
+        # Index of the centers used when `probes` is set, and the centers that moved since it was last updated
+        self.index = None
+        self.moved = set()
+
+        # Checkpoint updated by the last `refit`
+        self.resumed = None
+
+        # Counters of the work each fit does, the seconds spent in each phase and the objective after every iteration
+        self._reset_stats()
+
         if clusters == None:
+            self.cluster_size = 0
             self.clusters = [[] for _ in range(k)]
         else:
             self.cluster_size = len(clusters)
@@ -111,65 +310,692 @@ class KMeansVariation:
 
         :param data: Data to fit
         """
+        if self.time_budget_ms is not None:
+            self.deadline = time.monotonic() + self.time_budget_ms / 1000
+
+        prepare = {}
+        with timer(prepare, "prepare"):
+            objects = self._prepare(data)
+
+        # With nothing to cluster, every cluster only holds the objects it was created with
+        if len(objects) == 0:
+            self._reset_stats()
+            self.timings.update(prepare)
+            self.clusters = [list(cluster) for cluster in self.seeds]
+            self.objective = 0.0
+            self.stopped = "converged"
+            self.restarts = [{
+                "seed": None,
+                "labels": self._labels(),
+                "objective": 0.0,
+                "iterations": 0,
+                "time": prepare["prepare"],
+                "stopped": self.stopped,
+                "counters": dict(self.counters),
+                "timings": dict(self.timings),
+                "objectives": [],
+            }]
+            return self._results()
+
+        # Run every restart and keep the one with the lowest total distance
+        self.objects = objects
+        seeds = self.rng.integers(2**32, size=self.n_init)
+        if self.n_init == 1:
+            self.restarts = [self._restart(int(seeds[0]))]
+        else:
+            self.restarts = self._run_restarts([int(seed) for seed in seeds])
+
+        best = min(self.restarts, key=lambda restart: restart["objective"])
+        self._set_labels(best["labels"])
+        self.objective = best["objective"]
+        self.stopped = best["stopped"]
+
+        # Add up the work of every restart, which may have run in other processes
+        self._reset_stats()
+        self.timings.update(prepare)
+        for restart in self.restarts:
+            for key, value in restart["counters"].items():
+                self.counters[key] += value
+            for key, value in restart["timings"].items():
+                self.timings[key] = self.timings.get(key, 0.0) + value
+        self.objectives = best["objectives"]
+
+        return self._results()
+
+    def refit(self, data: List[any], labels: List[int], threshold: float = 0.0, checkpoint: Checkpoint|None = None) -> List[any]:
+        """
+        Fit data starting from a previous fit instead of freshly seeded centers
+
+        Items keep their previous cluster unless it is over capacity or moving them into a cluster that changed gains
+        more than `threshold`. Items without a previous cluster are placed in the nearest cluster with room. No seeding
+        or restarts are run. Values that support packing only compare the items whose cluster changed (or that have
+        none) with every center, and every other item with the centers of the clusters that changed. Starting from a
+        checkpoint of the previous fit, only the new items are packed as well, so the work done depends on how much
+        changed rather than on the number of items
+
+        :param data: Data to fit
+        :param labels: The previous cluster of every item in `data`, or -1 for items that weren't part of the previous fit.
+        Every cluster needs at least one seed object or previously clustered item to have a center
+        :param threshold: The distance an already clustered item has to gain before it is moved or swapped
+        :param checkpoint: Checkpoint of the previous fit (see `checkpoint`), which is updated in place. Clusters are
+        matched with the previous ones by their seed objects, so every cluster needs one. Without a checkpoint every
+        item is packed
+        """
+        start = time.perf_counter()
+        self._reset_stats()
+        if checkpoint is not None and any(len(seeds) == 0 for seeds in self.clusters):
+            checkpoint = None
+
+        labels = np.asarray(labels, dtype=np.int64)
+        with timer(self.timings, "prepare"):
+            objects = self._prepare(data, checkpoint)
+        self.objects = objects
+
+        self.clusters = [list(cluster) for cluster in self.seeds]
+        for obj, label in zip(objects, labels):
+            if label >= 0:
+                self.clusters[label].append(obj)
+
+        if self.packed is None:
+            # Centers of the previous clusters, without the items that left
+            self.centroids = None
+            self.centers = [None] * self.k
+            self._update_centers()
+            self._update_distances()
+        else:
+            with timer(self.timings, "update_centers"):
+                self._resume(checkpoint)
+            self._refresh_distances()
+
+        # Clusters that shrank in capacity give up the members furthest from their center
+        capacity = math.ceil(self.cluster_size)
+        unplaced = [obj for obj, label in zip(objects, labels) if label < 0]
+        for i, cluster in enumerate(self.clusters):
+            excess = len(cluster) - capacity
+            movable = cluster[len(self.seeds[i]):]
+            if excess > 0 and len(movable) > 0:
+                # A cluster can't give up more than its movable members, whatever its seeds take up
+                kept = max(0, len(movable) - excess)
+                movable.sort(key=lambda obj: self.distances[obj.index, i])
+                unplaced += movable[kept:]
+                self.clusters[i] = self.seeds[i] + movable[:kept]
+
+        if self.packed is not None:
+            self.centroids.update(self._labels())
+            self._refresh_distances()
+
+        self._assign_clusters(unplaced, self.clusters)
+        if self.packed is None:
+            self._update_centers()
+            self._update_distances()
+        else:
+            self.centroids.update(self._labels())
+            self._refresh_distances()
+
+        # Only move previously clustered items when it is clearly worth it
+        threshold = max(threshold, min_gain)
+        if self.packed is None:
+            self._optimize_clusters(objects, threshold=threshold)
+            self._update_centers()
+            self._update_distances()
+        else:
+            self._optimize_clusters(objects, threshold=threshold, rows=self._candidates(threshold))
+            self._refresh_distances()
+
+            self.resumed.distances = self.own
+            self.resumed.centroids = self.centroids
 
+        self.objective = self._objective()
+        self.objectives = [self.objective]
+        self.restarts = [{
+            "seed": None,
+            "labels": self._labels(),
+            "objective": self.objective,
+            "iterations": 1,
+            "time": time.perf_counter() - start,
+            "stopped": "converged",
+            "counters": dict(self.counters),
+            "timings": dict(self.timings),
+            "objectives": list(self.objectives),
+        }]
+
+        return self._results()
+
+    def checkpoint(self) -> Checkpoint|None:
+        """
+        Keep what a later `refit` can start from instead of this fit
+
+        :return: Checkpoint of the fit, or None if the values don't support packing. The checkpoint shares the packed
+        members of the fit, and a `refit` starting from it updates it in place
+        """
+        if self.resumed is not None:
+            return self.resumed
+        if self.packed is None or self.centroids is None:
+            return None
+
+        return Checkpoint(self.packed, [obj.value for obj in self.members], self.centroids)
+
+    def _prepare(self, data: List[any], checkpoint: Checkpoint|None = None) -> List[Object]:
+        """
+        Wrap the data in objects and prepare everything the restarts share
+
+        :param data: Data to fit
+        :param checkpoint: Checkpoint whose packed rows the members are placed in, so only new members are packed
+        :return: The objects wrapping the data, in the same order
+        """
         # Convert the data into objects so we can attach attributes to them
         objects = [Object(item) for item in data]
+        for obj in objects:
+            obj.removed_centers = np.zeros(self.k, dtype=bool)
 
         self.cluster_size = (self.cluster_size + len(objects)) / self.k
 
-        # For our set number of iterations, assign clusters and optimize
+        # Every assignment starts again from the objects the clusters were created with
+        self.seeds = [list(cluster) for cluster in self.clusters]
+
+        # Give every cluster member a row in the distance matrix
+        members = [obj for cluster in self.seeds for obj in cluster] + objects
+        self.packed = None
+        self.centroids = None
+        self.resumed = None
+        if checkpoint is not None:
+            # Rows of the checkpoint that are no longer used have no member
+            rows = checkpoint.place([obj.value for obj in members])
+            self.members = [None] * len(checkpoint)
+            for obj, row in zip(members, rows):
+                obj.index = row
+                self.members[row] = obj
+
+            self.packed = checkpoint.cohort()
+            self.resumed = checkpoint
+        else:
+            self.members = members
+            for i, obj in enumerate(self.members):
+                obj.index = i
+
+        # Rows of the objects being fit. Seed objects always stay in the cluster they started in
+        self.rows = np.array([obj.index for obj in objects], dtype=np.int64)
+
+        # Pack the members once so centers can be maintained as running sums
+        if self.packed is None and len(self.members) > 0 and hasattr(type(self.members[0].value), "pack"):
+            self.packed = type(self.members[0].value).pack([obj.value for obj in self.members])
+
+        return objects
+
+    def _resume(self, checkpoint: Checkpoint|None) -> None:
+        """
+        Bring the running sums of a checkpoint up to date with the current clusters, or start a checkpoint of them.
+        Clusters whose members changed are left dirty (see `cohort.Centroids`), the distances of every other member
+        to its center are kept
+
+        :param checkpoint: Checkpoint of the previous fit, already holding the current members (see `_prepare`)
+        """
+        labels = self._labels()
+        if checkpoint is None:
+            self.resumed = Checkpoint(self.packed, [obj.value for obj in self.members], self.packed.centroids(labels, self.k))
+        else:
+            # Clusters are matched with the previous ones through their seeds. Members of clusters that are gone
+            # leave them before the clusters are renumbered
+            centroids = checkpoint.centroids
+            positions = np.full(centroids.k, -1, dtype=np.int64)
+            for i, seeds in enumerate(self.seeds):
+                for obj in seeds:
+                    if centroids.labels[obj.index] >= 0:
+                        positions[centroids.labels[obj.index]] = i
+
+            for row in np.flatnonzero((centroids.labels >= 0) & (positions[np.maximum(centroids.labels, 0)] < 0)):
+                centroids.move(row, -1)
+            centroids.relabel(positions, self.k)
+            centroids.update(labels)
+
+        self.centroids = self.resumed.centroids
+        self.own = self.resumed.distances
+
+        # Only the distances to each member's own center are known so far. Rows that were compared with every center
+        # and centers that were compared with every row are tracked as they are filled in
+        self.distances = np.full((len(self.members), self.k), math.inf)
+        self.complete = np.zeros(len(self.members), dtype=bool)
+        self.compared = np.zeros(self.k, dtype=bool)
+        assigned = np.flatnonzero(labels >= 0)
+        self.distances[assigned, labels[assigned]] = self.own[assigned]
+
+    @timed("distances")
+    def _refresh_distances(self) -> None:
+        """
+        Bring the cached distances up to date after members changed clusters. Every member is compared with the centers
+        of clusters that changed, and objects in a changed cluster or in none are compared with every center the first
+        time, so they can move anywhere. Distances between other objects and centers stay unknown (infinite)
+        """
+        changed = np.array(sorted(self.centroids.dirty), dtype=np.int64)
+        self.centers = self.centroids.to_cohort()
+
+        labels = self.centroids.labels
+        current = labels[self.rows]
+        rows = self.rows[~self.complete[self.rows] & (np.isin(current, changed) | (current < 0))]
+        if len(changed) == 0 and len(rows) == 0:
+            return
+
+        self.counters["distance_matrices"] += 1
+        self.compared[changed] = True
+        if len(changed) == self.k:
+            self.counters["comparisons"] += len(self.members) * self.k
+            self.distances = (1 - self.packed.similarity(self.centers))/2.0
+            self.complete[self.rows] = True
+        else:
+            if len(changed) > 0:
+                self.counters["comparisons"] += len(self.members) * len(changed)
+                self.distances[:, changed] = (1 - self.packed.similarity(self.centers.take(changed)))/2.0
+            if len(rows) > 0:
+                self.counters["comparisons"] += len(rows) * self.k
+                self.distances[rows] = (1 - self.packed.take(rows).similarity(self.centers))/2.0
+                self.complete[rows] = True
+
+        assigned = np.flatnonzero(labels >= 0)
+        self.own[assigned] = self.distances[assigned, labels[assigned]]
+        self.own[labels < 0] = math.inf
+
+    def _candidates(self, threshold: float) -> np.ndarray[any]:
+        """
+        Find the objects that can gain more than a threshold by moving or swapping, given that objects not compared with
+        every center can only go to clusters that changed
+
+        :param threshold: The smallest gain a move or swap must make
+        :return: The rows of the candidates
+        """
+        complete = self.complete[self.rows]
+        rows = self.rows[complete]
+        others = self.rows[~complete]
+        if len(others) == 0:
+            return self.rows
+
+        # A swap pairs an object that wasn't compared with every center with one that was, so it can't gain more than
+        # the best gain of those
+        best = float((self.own[rows, None] - self.distances[rows]).max(initial=0.0))
+        gains = self.own[others, None] - self.distances[np.ix_(others, np.flatnonzero(self.compared))]
+        candidates = others[gains.max(axis=1, initial=-math.inf) > threshold - best]
+
+        return np.sort(np.concatenate([rows, candidates]))
+
+    def _reset_stats(self) -> None:
+        """
+        Clear the counters, phase timings and objectives before a new fit or restart
+        """
+        self.counters = {"comparisons": 0, "distance_matrices": 0, "heap_pushes": 0, "moves": 0, "swaps": 0, "fallbacks": 0}
+        self.timings = {}
+        self.objectives = []
+
+    def _results(self) -> List[List[any]]:
+        """
+        Unwrap the values of every cluster
+
+        :return: The values in each cluster
+        """
+        results = []
+        for cluster in self.clusters:
+            results.append([obj.value for obj in cluster])
+
+        return results
+
+    def _run(self, objects: List[Object]) -> int:
+        """
+        Cluster the objects once, starting from freshly seeded centers
+
+        :param objects: The objects to cluster
+        :return: The number of iterations that ran
+        """
+        self.clusters = [list(cluster) for cluster in self.seeds]
+        self.centroids = None
+        self.index = None
+
+        # For our set number of iterations, assign clusters and optimize. Distances only change when the
+        # centers do, so the matrix computed after each update is shared by the optimization and the next assignment
         self._initialize_centers(objects)
+        self._update_distances()
+        previous = None
+        best = None
+        iterations = 0
+        self.stopped = "max_iter"
         for _ in range(self.max_iter):
+            iterations += 1
             self._assign_clusters(objects)
             self._update_centers()
-            if not self._optimize_clusters(objects):
+            self._update_distances()
+            moved = self._optimize_clusters(objects)
+            self.objectives.append(self._objective())
+
+            # Capacity limits can make an iteration worse than an earlier one, so the best clusters are remembered
+            labels = self._labels()
+            if best is None or self.objectives[-1] < best[0]:
+                best = (self.objectives[-1], labels)
+
+            # Stop once an iteration moves nothing or ends with the same clusters as the one before it
+            if not moved or (previous is not None and np.array_equal(labels, previous)):
+                self.stopped = "converged"
+                break
+            if self.tol > 0 and len(self.objectives) > 1 and self.objectives[-2] - self.objectives[-1] < self.tol * self.objectives[-2]:
+                self.stopped = "tolerance"
                 break
+            if self._past_deadline():
+                self.stopped = "deadline"
+                break
+            previous = labels
 
-        # Return data
-        results = []
-        for cluster in self.clusters:
-            results.append([obj.value for obj in cluster])
+        if not np.array_equal(best[1], labels):
+            self._set_labels(best[1])
 
-        return results
+        return iterations
+
+    def _restart(self, seed: int) -> dict:
+        """
+        Run one independent restart of the fit
+
+        :param seed: The seed used for k-means++ in this restart
+        :return: dict holding the seed, the final labels, the total distance, the iteration count, the wall time and the
+        counters, phase timings and objective after every iteration of the restart
+        """
+        start = time.perf_counter()
+        self._reset_stats()
+        self.rng = np.random.default_rng(seed)
+        iterations = self._run(self.objects)
+
+        # Score the final clusters against their final centers
+        self._update_centers()
+        self._update_distances()
+
+        return {
+            "seed": seed,
+            "labels": self._labels(),
+            "objective": self._objective(),
+            "iterations": iterations,
+            "time": time.perf_counter() - start,
+            "stopped": self.stopped,
+            "counters": dict(self.counters),
+            "timings": dict(self.timings),
+            "objectives": list(self.objectives),
+        }
+
+    def _past_deadline(self) -> bool:
+        """
+        Check whether the time budget of the fit is spent
+
+        :return: True once the deadline has passed, always False without a time budget
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _run_restarts(self, seeds: List[int]) -> List[dict]:
+        """
+        Run restarts in the shared worker pool (see `jobs.shared_pool`). The packed members are written once to a
+        memory-mapped directory every worker opens, and the seeds are split between `n_jobs` tasks. Workers only send
+        back labels and scores. Values that don't support saving their packed form run their restarts in this process
+
+        :param seeds: The seed of every restart
+        :return: The result of every restart that ran, in the order of their seeds
+        """
+        n_jobs = min(self.n_jobs, len(seeds))
+        if n_jobs <= 1 or not hasattr(self.packed, "save"):
+            # Restarts that haven't started by the deadline are skipped, the first one always runs
+            restarts = []
+            for seed in seeds:
+                if len(restarts) > 0 and self._past_deadline():
+                    break
+                restarts.append(self._restart(seed))
+
+            return restarts
+
+        # The pool is shared with the rest of the backend, which is only loaded once restarts use it
+        import jobs
+
+        with tempfile.TemporaryDirectory(prefix="kmeans-") as path:
+            shared = self._share(path)
+            tasks = [(shared, seeds[i::n_jobs]) for i in range(n_jobs)]
+            results = jobs.run_parallel(restart_worker, tasks, n_jobs)
+
+        # Put the restarts back in the order of their seeds, so ties are broken the same way in any number of processes
+        positions = [i + j * n_jobs for i, restarts in enumerate(results) for j in range(len(restarts))]
+        restarts = [restart for restarts in results for restart in restarts]
+        return [restarts[i] for i in np.argsort(positions, kind="stable")]
+
+    def _share(self, path: str) -> dict:
+        """
+        Save what restarts need to a directory, so a worker process can run them without the values being clustered
+
+        :param path: The directory to write the packed members to
+        :return: dict holding the settings of the fit, the rows of the seed objects and the objects being fit and the
+        location of the packed members (see `_from_shared`)
+        """
+        self.packed.save(path)
+
+        return {
+            "packed": (type(self.packed), path),
+            "k": self.k,
+            "max_iter": self.max_iter,
+            "n_candidates": self.n_candidates,
+            "probes": self.probes,
+            "tol": self.tol,
+            "deadline": self.deadline,
+            "cluster_size": self.cluster_size,
+            "members": len(self.members),
+            "seeds": [[obj.index for obj in cluster] for cluster in self.seeds],
+            "rows": self.rows,
+        }
+
+    @classmethod
+    def _from_shared(cls, shared: dict):
+        """
+        Rebuild a fit that restarts can run on from what another process shared (see `_share`). Its objects only hold
+        their rows, as restarts of packed members never look at the values
+
+        :param shared: What the fit shares
+        :return: KMeansVariation ready to run restarts
+        """
+        model = cls(shared["k"], shared["max_iter"], n_candidates=shared["n_candidates"], probes=shared["probes"], tol=shared["tol"])
+        model.deadline = shared["deadline"]
+        model.cluster_size = shared["cluster_size"]
+
+        packed, path = shared["packed"]
+        model.packed = packed.load(path)
+
+        model.members = [Object(None) for _ in range(shared["members"])]
+        for i, obj in enumerate(model.members):
+            obj.index = i
+            obj.removed_centers = np.zeros(model.k, dtype=bool)
+
+        model.seeds = [[model.members[row] for row in rows] for rows in shared["seeds"]]
+        model.rows = shared["rows"]
+        model.objects = [model.members[row] for row in model.rows]
+
+        return model
+
+    def _objective(self) -> float:
+        """
+        Find the total distance from every object to the center of its cluster using the cached distances
+
+        :return: The total distance
+        """
+        labels = self._labels()
+        return float(self.distances[self.rows, labels[self.rows]].sum())
+
+    def _set_labels(self, labels: np.ndarray[any]) -> None:
+        """
+        Rebuild the clusters and their centers from the cluster of every member
+
+        :param labels: The cluster of every member
+        """
+        self.clusters = [list(cluster) for cluster in self.seeds]
+        for row in self.rows:
+            self.clusters[labels[row]].append(self.members[row])
+
+        if self.packed is not None:
+            self.centroids = self.packed.centroids(labels, self.k)
+            self.centers = self.centroids.to_cohort()
+            self.index = None
+        else:
+            self.centers = [cluster[0].average_with(cluster[1:]) if len(cluster) > 0 else None for cluster in self.clusters]
+
+    @timed("distances")
+    def _update_distances(self) -> None:
+        """
+        Compute the distance from every cluster member to every center in one pass and cache it for all phases of the iteration
+        """
+        self.counters["distance_matrices"] += 1
+
+        # With an index, only distances to nearby centers are computed
+        n_cells = max(1, round(math.sqrt(self.k)))
+        if self.packed is not None and self.probes is not None and self.probes < n_cells:
+            self.distances = self._indexed_distances(n_cells)
+            return
+
+        self.counters["comparisons"] += len(self.members) * len(self.centers)
+        if self.packed is None:
+            self.distances = Object.distance_matrix(self.members, self.centers)
+        else:
+            self.distances = (1 - self.packed.similarity(self.centers))/2.0
+
+    def _indexed_distances(self, n_cells: int) -> np.ndarray[any]:
+        """
+        Compute the distance from every cluster member to the centers in the index cells searched for it and in the cell
+        of its current center, so the cost of staying is always known. Every other distance is left infinite
 
+        :param n_cells: The number of cells to group the centers into
+        :return: (len(members), k) matrix of distances
+        """
+        # The cells are built once per restart. Centers that moved since the last update are placed in their nearest
+        # cell, and the cells are only built again once the centers drifted away from them
+        if self.index is not None:
+            self.index.update(self.centers, sorted(self.moved))
+            self.counters["comparisons"] += self.index.comparisons
+        if self.index is None or self.index.stale():
+            self.index = CenterIndex(self.centers, n_cells)
+            self.counters["comparisons"] += self.index.comparisons
+        self.moved = set()
+
+        index = self.index
+        probed = index.search(self.packed, self.probes)
+        self.counters["comparisons"] += len(self.members) * len(index)
+
+        labels = self._labels()
+        current = np.where(labels >= 0, index.labels[np.maximum(labels, 0)], -1)
+
+        # Score each cell as one batch against the members that search it
+        distances = np.full((len(self.members), self.k), math.inf)
+        for cell, columns in enumerate(index.members):
+            rows = np.flatnonzero((probed == cell).any(axis=1) | (current == cell))
+            if len(rows) == 0 or len(columns) == 0:
+                continue
+
+            distances[np.ix_(rows, columns)] = (1 - self.packed.take(rows).similarity(self.centers.take(columns)))/2.0
+            self.counters["comparisons"] += len(rows) * len(columns)
+
+        return distances
+
+    def _exhaustive_distances(self, row: int) -> np.ndarray[any]:
+        """
+        Fill in the distances from one member to every center, for when none of the centers the index found has room
+
+        :param row: The member's row in the distance matrix
+        :return: The member's distances to every center
+        """
+        self.counters["fallbacks"] += 1
+        self.counters["comparisons"] += len(self.centers)
+
+        self.distances[row] = (1 - self.packed.take([row]).similarity(self.centers)[0])/2.0
+        return self.distances[row]
+
+    def _distances_to(self, objects: List[Object], candidates: List[int], packed=None) -> np.ndarray[any]:
+        """
+        Find the distance from every object to a few candidate objects
+
+        :param objects: The objects to compare
+        :param candidates: The positions in `objects` of the candidates
+        :param packed: The objects packed in the same order, if the values support packing
+        :return: (len(objects), len(candidates)) matrix of distances
+        """
+        self.counters["comparisons"] += len(objects) * len(candidates)
+
+        if packed is None:
+            return Object.distance_matrix(objects, [objects[i] for i in candidates])
+
+        return (1 - packed.similarity(packed.take(candidates)))/2.0
+
+    @timed("seed")
     def _initialize_centers(self, objects: List[Object]) -> None:
         """
-        Initialize the centers of the kmeans search by using k-means++ or by providing objects directly
+        Initialize the centers of the kmeans search by using k-means++
 
-        :param data: data to analyze
-        :param centers: centers to provide already
-        :param method: what method to use to calculate centers
+        The distance from every object to its nearest center is kept between steps, so each step only compares
+        the objects against the center that was just added
+
+        :param objects: objects to pick the centers from
         """
+        packed = None
+        if self.packed is not None:
+            packed = self.packed.take([obj.index for obj in objects])
+
         # Add the first center randomly from our list of data
-        self.centers = [objects[np.random.randint(len(objects))]]
+        chosen = [int(self.rng.integers(len(objects)))]
+        closest = self._distances_to(objects, chosen, packed)[:, 0]
 
         # Keep adding clusters until we have k clusters. Clusters are added probabalistically such that 
         # clusters further from other centers are more likely to be clusters
-        for _ in range(len(self.centers), self.k):
-            distances = [min(obj.compare_to(c) for c in self.centers) for obj in objects]
-            probs = [d / sum(distances) for d in distances]
-            self.centers.append(np.random.choice(objects, p=probs))
+        for _ in range(len(chosen), self.k):
+            # Out of time, so the remaining centers are picked at random without comparing them to anything
+            if self._past_deadline():
+                chosen += self.rng.choice(len(objects), size=self.k - len(chosen)).tolist()
+                break
+
+            # Rounding can leave identical objects a hair below zero apart
+            weights = np.maximum(closest, 0)
+            total = weights.sum()
+            probs = weights / total if total > 0 else None
+            candidates = self.rng.choice(len(objects), size=self.n_candidates, p=probs)
+
+            # Keep the candidate that leaves the smallest total distance to the nearest centers
+            distances = self._distances_to(objects, candidates, packed)
+            if len(candidates) > 1:
+                best = int(np.argmin(np.minimum(closest[:, None], distances).sum(axis=0)))
+            else:
+                best = 0
 
-    def _assign_clusters(self, objects: List[Object]) -> None:
+            chosen.append(int(candidates[best]))
+            closest = np.minimum(closest, distances[:, best])
+
+        self.centers = [objects[i] for i in chosen]
+
+        # Packed centers are rows of the packed members
+        if self.packed is not None:
+            self.centers = self.packed.take([c.index for c in self.centers])
+
+    @timed("assign")
+    def _assign_clusters(self, objects: List[Object], start: List[List[Object]]|None = None) -> None:
         """
         Assign objects into k clusters depending on their distance nearest_distances
 
         :param objects: objects to assign into cluster
+        :param start: The clusters to add the objects to, defaults to the seed objects
         """
+        if start is None:
+            start = self.seeds
+
         heap = Heap()
 
         # For each object, find the center it is closest to and by how much, then add it to the heap
         for obj in objects:
-            distances = [obj.compare_to(c) for c in self.centers]
+            # Centers that were full in an earlier assignment may have room in this one
+            obj.removed_centers[:] = False
+
+            distances = self.distances[obj.index]
             nearest_center_index = np.argmin(distances)
+            if not np.isfinite(distances[nearest_center_index]):
+                distances = self._exhaustive_distances(obj.index)
+                nearest_center_index = np.argmin(distances)
 
             obj.nearest_distance = distances[nearest_center_index]
             obj.nearest_center_index = nearest_center_index
 
             heap.append(obj)
 
-        cluster_sizes = [len(cluster) for cluster in self.clusters]
-        temp_clusters = [self.clusters[i] for i in range(self.k)]
+        cluster_sizes = [len(cluster) for cluster in start]
+        temp_clusters = [list(cluster) for cluster in start]
 
         # While the heap is not empty
         while not heap.isEmpty():
@@ -183,8 +1009,14 @@ class KMeansVariation:
                 cluster_sizes[nearest_index] += 1
             else:
                 # The cluster this object wants to be in has no room, so find the second nearest index and never consider the first index again
-                obj.removed_centers.append(nearest_index)
-                second_nearest_index = np.argmin([math.inf if i in obj.removed_centers else obj.compare_to(self.centers[i]) for i in range(len(self.centers))])
+                obj.removed_centers[nearest_index] = True
+                distances = self.distances[obj.index]
+                second_nearest_index = np.argmin(np.where(obj.removed_centers, math.inf, distances))
+
+                # Every center the index found for this object is full, so fall back to comparing it with all centers
+                if obj.removed_centers[second_nearest_index] or not np.isfinite(distances[second_nearest_index]):
+                    distances = self._exhaustive_distances(obj.index)
+                    second_nearest_index = np.argmin(np.where(obj.removed_centers, math.inf, distances))
 
                 # The second nearest cluster has no room, so update the object's inner score and index and add it back to the heap
                 obj.nearest_distance = distances[second_nearest_index]
@@ -196,77 +1028,172 @@ class KMeansVariation:
                     cluster_sizes[second_nearest_index] += 1
                 else:
                     heap.append(obj)
+                    self.counters["heap_pushes"] += 1
 
         # Update the k-means clusters
         self.clusters = temp_clusters
 
+    @timed("update_centers")
     def _update_centers(self) -> None:
         """
         Update the centers of the clusters now that the clusters are populated by finding averages in the clusters
         """
 
+        # Packed members only need the running sums of clusters whose members changed
+        if self.packed is not None:
+            labels = self._labels()
+            if self.centroids is None:
+                self.centroids = self.packed.centroids(labels, self.k, initial=self.centers)
+            else:
+                self.centroids.update(labels)
+
+            self.moved |= self.centroids.dirty
+            self.centers = self.centroids.to_cohort()
+            return
+
         # For each cluster that has more than one object, find the average
         for i, cluster in enumerate(self.clusters):
             if len(cluster) > 0:
                 self.centers[i] = cluster[0].average_with(cluster[1:])
 
-    def _optimize_clusters(self, objects: List[Object]) -> bool:
-        """
-        Optimize clusters by swapping objects that yields overall improvement to the system
+    def _labels(self) -> np.ndarray[any]:
         """
-        proposals = defaultdict(list)
-        moved = False
+        Find the cluster of every member from the current clusters
 
-        # For every object in each cluster
+        :return: array holding the cluster index of each member, or -1 for members in no cluster
+        """
+        labels = np.full(len(self.members), -1, dtype=np.int64)
         for i, cluster in enumerate(self.clusters):
             for obj in cluster:
-                # Find the distances from this object to every center
-                distances = [obj.compare_to(c) for c in self.centers]
-                current_distance = distances[i]
-
-                # Find the closest index of all centers
-                closest_other_index = np.argmin(distances)
-                if closest_other_index != i:
-                    # If the closest of all centers is not the cluster this object currently belongs in
-                    if len(self.clusters[closest_other_index]) < len(objects) // self.k:
-                        # Move clusters if the other cluster is not full
-                        self.clusters[closest_other_index].append(obj)
-                        self.clusters[i].remove(obj)
-                        moved = True
-                    else:
-                        # Append it to a proposal if other cluster is full
-                        proposals[closest_other_index].append((obj, distances[closest_other_index] - current_distance, closest_other_index, i))
-
-        # If there were no movements (i.e. every object is perfect or all clusters are full)
+                labels[obj.index] = i
+
+        return labels
+
+    @timed("optimize")
+    def _optimize_clusters(self, objects: List[Object], threshold: float = min_gain, rows: np.ndarray[any]|None = None) -> bool:
+        """
+        Optimize clusters by moving and swapping objects while it yields overall improvement to the system
+
+        Each round scores every possible move and the swaps into the `swap_targets` clusters every object gains the
+        most by moving to, using the cached distance matrix. It applies every improving move or swap that doesn't touch
+        an object already changed in that round. Rounds repeat until nothing improves. The gains of every object are
+        kept in one buffer reused by every round, and only the pairs of clusters that were offered are scored, so no
+        round holds a k x k matrix
+
+        :param threshold: The smallest gain a move or swap must make to be applied
+        :param rows: The rows of the objects that may move, defaults to every object
+        :return: True if any object changed clusters
+        """
+        labels = self._labels()
+        if rows is None:
+            rows = self.rows
+        sizes = np.bincount(labels[labels >= 0], minlength=self.k)
+        min_size = math.floor(self.cluster_size)
+
+        gains = np.empty((len(rows), self.k))
+        n_targets = min(swap_targets, self.k)
+        offered = np.empty((len(rows), n_targets), dtype=np.int64)
+
+        moved = False
+        for _ in range(self.max_iter):
+            current = labels[rows]
+
+            # Gain of moving each object from its cluster to every other cluster (positive is better)
+            np.take(self.distances, rows, axis=0, out=gains, mode="clip")
+            np.subtract(self.distances[rows, current][:, None], gains, out=gains)
+
+            # Move objects into clusters that still have room, best gains first, as long as their current cluster
+            # keeps at least an even share
+            changed = np.zeros(len(rows), dtype=bool)
+            targets = np.argmax(gains, axis=1)
+            best = gains[np.arange(len(rows)), targets]
+            for i in np.argsort(-best, kind="stable"):
+                if best[i] <= threshold:
+                    break
+
+                source, target = current[i], targets[i]
+                if sizes[target] < self.cluster_size and sizes[source] > min_size:
+                    labels[rows[i]] = target
+                    sizes[source] -= 1
+                    sizes[target] += 1
+                    changed[i] = True
+                    self.counters["moves"] += 1
+
+            # Every object is offered swaps into the clusters it gains the most by moving to. Going to cluster p from
+            # cluster q, the best partner is the object in p that gains the most (or loses the least) by going to q,
+            # which is only found for the (p, q) pairs that were offered
+            for start in range(0, len(rows), swap_block):
+                block = slice(start, start + swap_block)
+                offered[block] = np.argpartition(gains[block], self.k - n_targets, axis=1)[:, self.k - n_targets:]
+            pairs, inverse = np.unique(offered * self.k + current[:, None], return_inverse=True)
+            inverse = inverse.reshape(offered.shape)
+            pair_targets, pair_sources = np.divmod(pairs, self.k)
+
+            order = np.argsort(current, kind="stable")
+            bounds = np.searchsorted(current[order], np.arange(self.k + 1))
+            pair_bounds = np.searchsorted(pair_targets, np.arange(self.k + 1))
+            partner_gains = np.full(len(pairs), -math.inf)
+            partners = np.full(len(pairs), -1, dtype=np.int64)
+            for p in np.unique(pair_targets):
+                members = order[bounds[p]:bounds[p + 1]]
+                members = members[~changed[members]]
+                if len(members) > 0:
+                    span = slice(pair_bounds[p], pair_bounds[p + 1])
+                    member_gains = gains[np.ix_(members, pair_sources[span])]
+                    best_members = np.argmax(member_gains, axis=0)
+                    partner_gains[span] = member_gains[best_members, np.arange(len(best_members))]
+                    partners[span] = members[best_members]
+
+            # Gain of swapping each object into every offered cluster with the best partner from that cluster. Staying
+            # in the same cluster is not a swap
+            scores = np.take_along_axis(gains, offered, axis=1) + partner_gains[inverse]
+            scores[offered == current[:, None]] = -math.inf
+            scores[changed] = -math.inf
+
+            choices = np.argmax(scores, axis=1)
+            targets = offered[np.arange(len(rows)), choices]
+            best = scores[np.arange(len(rows)), choices]
+            chosen = inverse[np.arange(len(rows)), choices]
+
+            # Apply the best swaps first, skipping swaps that touch an object that already changed this round
+            for i in np.argsort(-best, kind="stable"):
+                if best[i] <= threshold:
+                    break
+
+                j = partners[chosen[i]]
+                if changed[i] or j < 0 or changed[j]:
+                    continue
+
+                labels[rows[i]] = targets[i]
+                labels[rows[j]] = current[i]
+                changed[i] = True
+                changed[j] = True
+                self.counters["swaps"] += 1
+
+            if not changed.any():
+                break
+            moved = True
+
         if moved:
-            # Loop through each cluster's proposed switches (if there are any)
-            for i, cluster in enumerate(self.clusters):
-                if proposals[i]:
-                    # Find the best swap
-                    best_swap = max(proposals[i], key=lambda x: x[1])
-                    obj, improvement, other_index, current_index = best_swap
-
-                    # Find the best other object to swap with
-                    min_loss = math.inf
-                    min_other = None
-                    for other in self.clusters[other_index]:
-                        loss = self.centers[current_index].compare_to(other)
-                        if loss < min_loss:
-                            min_loss = loss
-                            min_other = other
-
-                    # If we get more improvement than loss, swap the objects
-                    if improvement > loss:
-                        self.clusters[other_index].remove(min_other)
-                        self.clusters[other_index].append(obj)
-
-                        self.clusters[current_index].remove(obj)
-                        self.clusters[current_index].append(min_other)
-
-                        moved = True
+            self._apply_labels(labels)
 
         return moved
 
+    def _apply_labels(self, labels: np.ndarray[any]) -> None:
+        """
+        Rebuild the clusters from new labels, keeping the order of objects that stayed and updating the running sums
+
+        :param labels: The new cluster of every member
+        """
+        clusters = [[obj for obj in cluster if labels[obj.index] == i] for i, cluster in enumerate(self.clusters)]
+        previous = self._labels()
+        for row in np.flatnonzero(previous != labels):
+            clusters[labels[row]].append(self.members[row])
+
+        self.clusters = clusters
+        if self.centroids is not None:
+            self.centroids.update(labels)
+
 # Example usage
 if __name__ == "__main__":
     # Dummy Vec class that implements required methods. A vector is used as encapsulated data for easy and
@@ -277,7 +1204,8 @@ if __name__ == "__main__":
             self.vector = vector
 
         def compare_to(self, v) -> float:
-            return np.linalg.norm(np.array(self.vector) - np.array(v.vector))
+            # Cosine similarity, so scores fall in [-1, 1] like `Student.compare_to`
+            return float(np.dot(self.vector, v.vector) / (np.linalg.norm(self.vector) * np.linalg.norm(v.vector)))
 
         def average_with(self, vectors):
             vector = np.mean(np.concatenate(([self.vector], [v.vector for v in vectors])), axis=0)
@@ -286,7 +1214,6 @@ if __name__ == "__main__":
     # Create sample data and fit by kmeans clustering
     data = [Vec(i, np.random.rand(3)) for i in range(100)]
     kmeans = KMeansVariation(k=50)
-    kmeans.initialize_centers(data, method="kmeans++")
     clusters = kmeans.fit(data)
 
     # Print out clustering results
@@ -294,4 +1221,4 @@ if __name__ == "__main__":
         print(f"Cluster {i} contains {len(cluster)} objects.")
         for vector in cluster:
             print(vector.id, end=" ")
-        print()
\ No newline at end of file
+        print()
@@ -0,0 +1,258 @@
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the buckets used for phase durations
+duration_buckets = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Upper bounds of the buckets used for k-means iteration counts
+iteration_buckets = [1, 2, 3, 5, 10, 20, 50, 100]
+
+@contextmanager
+def timer(timings: dict, phase: str):
+    """
+    Add the wall time of a block to a phase
+
+    :param timings: The total seconds spent in every phase
+    :param phase: The phase the block belongs to
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+def timed(phase: str):
+    """
+    Decorate a method so its wall time is added to a phase of the instance's `timings` dict
+
+    :param phase: The phase the method belongs to
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with timer(self.timings, phase):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """
+    Format label pairs the way the Prometheus text format expects them
+
+    :param names: The label names
+    :param values: The label values, in the same order
+    :param extra: An already formatted label to add at the end
+    :return: The labels in braces, or an empty string if there are none
+    """
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+# Counter is a monotonically increasing value per label combination
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        """
+        Initialize a counter without any values
+
+        :param name: The name of the metric
+        :param help: The description of the metric
+        :param labels: The names of the labels every value is kept per
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increase the counter
+
+        :param amount: The amount to increase by
+        :param labels: The value of every label
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        """
+        Render the counter in the Prometheus text format
+
+        :return: The lines of the metric
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+
+        return lines
+
+# Histogram counts observations into cumulative buckets per label combination
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: list[float], labels: tuple = ()):
+        """
+        Initialize a histogram without any observations
+
+        :param name: The name of the metric
+        :param help: The description of the metric
+        :param buckets: The upper bounds of the buckets, in increasing order
+        :param labels: The names of the labels every histogram is kept per
+        """
+        self.name = name
+        self.help = help
+        self.buckets = buckets + [math.inf]
+        self.labels = labels
+
+        # For every label combination: the count per bucket, the sum and the number of observations
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record one observation
+
+        :param value: The observed value
+        :param labels: The value of every label
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        """
+        Render the histogram in the Prometheus text format
+
+        :return: The lines of the metric
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    le = "+Inf" if bound == math.inf else str(bound)
+                    labels = format_labels(self.labels, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+
+        return lines
+
+# Sampled reads its values from a function whenever it is rendered, for totals that are already kept elsewhere
+class Sampled:
+    def __init__(self, name: str, help: str, type: str, label: str, sample):
+        """
+        Initialize a sampled metric
+
+        :param name: The name of the metric
+        :param help: The description of the metric
+        :param type: The Prometheus type of the metric (counter or gauge)
+        :param label: The name of the label the sampled values are kept per
+        :param sample: Function returning a dict of label value to metric value
+        """
+        self.name = name
+        self.help = help
+        self.type = type
+        self.label = label
+        self.sample = sample
+
+    def render(self) -> list[str]:
+        """
+        Render the current values in the Prometheus text format
+
+        :return: The lines of the metric
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in sorted(self.sample().items()):
+            lines.append(f"{self.name}{format_labels((self.label,), (key,))} {value}")
+
+        return lines
+
+# Registry holds every metric exposed by the process
+class Registry:
+    def __init__(self):
+        """
+        Initialize an empty registry
+        """
+        self.metrics = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        """
+        Create and register a counter (see `Counter`)
+        """
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: list[float], labels: tuple = ()) -> Histogram:
+        """
+        Create and register a histogram (see `Histogram`)
+        """
+        metric = Histogram(name, help, buckets, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def sampled(self, name: str, help: str, type: str, label: str, sample) -> Sampled:
+        """
+        Create and register a sampled metric (see `Sampled`)
+        """
+        metric = Sampled(name, help, type, label, sample)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format
+
+        :return: The text served by the metrics endpoint
+        """
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of the pairing pipeline
+registry = Registry()
+requests = registry.counter("pairing_requests_total", "Pairing requests that finished", ("endpoint", "engine"))
+phase_seconds = registry.histogram("pairing_phase_seconds", "Seconds spent in each phase of a pairing request", duration_buckets, ("phase",))
+iterations = registry.histogram("pairing_kmeans_iterations", "k-means iterations run per restart", iteration_buckets)
+events = registry.counter("pairing_events_total", "Work done while pairing, such as comparisons, heap re-pushes, moves and swaps", ("event",))
+cache_saved = registry.counter("pairing_cache_saved_seconds_total", "Seconds of embedding and clustering saved by serving cached results", ("endpoint",))
+
+def record(endpoint: str, engine: str, debug: dict, cache: dict|None = None) -> None:
+    """
+    Record the instrumentation of one pairing request
+
+    :param endpoint: The endpoint that handled the request
+    :param engine: The engine that created the pairs
+    :param debug: The timings, counters and per-restart iteration counts of the request
+    :param cache: How the result cache answered the request, if it was asked
+    """
+    requests.inc(endpoint=endpoint, engine=engine)
+    if cache is not None and cache["hit"]:
+        cache_saved.inc(cache["saved_seconds"], endpoint=endpoint)
+
+    for phase, seconds in debug.get("timings", {}).items():
+        phase_seconds.observe(seconds, phase=phase)
+    for event, count in debug.get("counters", {}).items():
+        events.inc(count, event=event)
+    for count in debug.get("iterations", []):
+        iterations.observe(count)
@@ -0,0 +1,558 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from pydantic import BaseModel
+import jobs
+import utils
+from assignment import capacitated_assignment, default_capacity
+from cache import LRUCache, ResultCache
+from student import StudentModel, Student
+from kmeans import Checkpoint, KMeansVariation
+from metrics import timer
+
+# Assignment remembers the students of a pairing and the mentor of every mentee, so the pairing can be
+# updated later without embedding everyone again. It also keeps the k-means checkpoint of the pairing and the
+# distance from every mentee to their mentor, so an update only compares what changed
+class Assignment:
+    def __init__(self, mentors: list[Student], mentees: list[Student], labels: np.ndarray[any], checkpoint: Checkpoint|None = None, distances: np.ndarray[any]|None = None):
+        """
+        Initialize an assignment
+
+        :param mentors: The mentors, one per pair
+        :param mentees: The mentees
+        :param labels: The position in `mentors` of every mentee's mentor
+        :param checkpoint: Checkpoint of the k-means fit of the pairing (see `KMeansVariation.checkpoint`), or None to
+        start one from the pairs when the assignment is first repaired
+        :param distances: The distance from every mentee to their mentor, or None to compute them when needed
+        """
+        self.mentors = mentors
+        self.mentees = mentees
+        self.labels = labels
+        self.checkpoint = checkpoint
+        self.distances = distances
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_clusters(cls, clusters: list[list[Student]], checkpoint: Checkpoint|None = None):
+        """
+        Build an assignment from clusters of students
+
+        :param clusters: Clusters of students, each starting with its mentor
+        :param checkpoint: Checkpoint of the k-means fit that made the clusters
+        :return: Assignment of the clusters
+        """
+        mentors = [cluster[0] for cluster in clusters]
+        mentees = [mentee for cluster in clusters for mentee in cluster[1:]]
+        labels = np.array([i for i, cluster in enumerate(clusters) for _ in cluster[1:]], dtype=np.int64)
+
+        return cls(mentors, mentees, labels, checkpoint)
+
+    def take_checkpoint(self) -> Checkpoint:
+        """
+        Hand over the checkpoint of the assignment, starting one from the pairs if there is none. A repair updates
+        the checkpoint in place, so it is only handed over once
+
+        :return: Checkpoint of the assignment
+        """
+        with self.lock:
+            checkpoint, self.checkpoint = self.checkpoint, None
+
+        if checkpoint is None:
+            values = self.mentors + self.mentees
+            packed = Student.pack(values)
+            labels = np.concatenate([np.arange(len(self.mentors)), self.labels])
+            checkpoint = Checkpoint(packed, values, packed.centroids(labels, len(self.mentors)))
+
+        return checkpoint
+
+    def distances_to_mentors(self) -> np.ndarray[any]:
+        """
+        Find the distance from every mentee to their mentor, computing them the first time
+
+        :return: (len(mentees),) vector of distances
+        """
+        if self.distances is None:
+            self.distances = pair_distances(self.mentees, [self.mentors[label] for label in self.labels])
+
+        return self.distances
+
+# CohortDelta describes the students that joined or left a cohort since it was paired
+class CohortDelta(BaseModel):
+    added: list[StudentModel] = []
+    removed: list[str] = []
+
+# Recent assignments that can be updated with `repair`. The number kept can be configured through the environment
+assignments = LRUCache(int(os.environ.get("ASSIGNMENT_CACHE_SIZE", 100)))
+
+# Results of recent pairings, so repeating a request returns the same pairs without embedding or clustering again.
+# The number of entries, their total size, how long they are served and an optional SQLite file that keeps them
+# across restarts can be configured through the environment
+results = ResultCache(
+    int(os.environ.get("RESULT_CACHE_SIZE", 100)),
+    int(os.environ.get("RESULT_CACHE_BYTES", 64 * 1024 * 1024)),
+    float(os.environ.get("RESULT_CACHE_TTL", 3600)),
+    os.environ.get("RESULT_CACHE_PATH") or None,
+    int(os.environ.get("RESULT_CACHE_DISK_SIZE", 10000)),
+)
+
+# Id of the kept assignment of every cached result, by result key. Assignments only live in this process (see
+# `assignments`), so ids are never stored with the results themselves
+result_assignments = LRUCache(int(os.environ.get("ASSIGNMENT_CACHE_SIZE", 100)))
+
+# Version of the pairing results. Raise it when a change to the pairing code changes its results, so results
+# stored by an older version are not served
+result_version = 3
+
+# Options that don't change the pairs. Restarts give the same results in any number of processes, and results cut
+# short by a time budget are never stored
+uncached_options = ["n_jobs", "time_budget_ms"]
+
+def batch_worker(task: tuple) -> dict:
+    """
+    Pair one cohort of a batch in a worker process
+
+    :param task: The students of the cohort, the engine and the engine's options
+    :return: outcome of the cohort (see `pair_cohort`)
+    """
+    return pair_cohort(*task)
+
+def mentor_distances(mentees: list[Student], mentors: list[Student]):
+    """
+    Find the distance from every mentee to every mentor, on the same [0, 1] scale used by KMeansVariation
+
+    :param mentees: The mentees to compare (rows of the result)
+    :param mentors: The mentors to compare them to (columns of the result)
+    :return: (len(mentees), len(mentors)) matrix of distances
+    """
+    return (1 - Student.similarity_matrix(mentees, mentors))/2.0
+
+def pair_distances(mentees: list[Student], mentors: list[Student]) -> np.ndarray[any]:
+    """
+    Find the distance from every mentee to one mentor each, on the same scale as `mentor_distances`
+
+    :param mentees: The mentees to compare
+    :param mentors: The mentor to compare each mentee to, in the same order
+    :return: (len(mentees),) vector of distances
+    """
+    if len(mentees) == 0:
+        return np.zeros(0)
+
+    return (1 - Student.pack(mentees).row_similarity(Student.pack(mentors)))/2.0
+
+def pair_kmeans(mentors: list[Student], mentees: list[Student], seed: int|None = None, n_init: int = 1, n_jobs: int = 1, probes: int|None = None, time_budget_ms: float|None = None, tol: float = 0.0, keep: bool = False):
+    """
+    Pair mentees with mentors by clustering mentees around the mentors
+
+    :param seed: Seed for k-means++, the same seed always gives the same pairs
+    :param n_init: The number of restarts to run, the best one is kept
+    :param n_jobs: The number of processes to run restarts in
+    :param probes: The number of index cells searched for each mentee's nearest mentors, or None to compare every mentee
+    with every mentor (see `KMeansVariation`)
+    :param time_budget_ms: The milliseconds the fit may take before the best pairs found so far are returned, or None
+    to run until k-means converges
+    :param tol: Stop once an iteration improves the total distance by less than this share of it
+    :param keep: Whether to also return the checkpoint of the fit under "checkpoint", so the pairs can be repaired
+    :return: clusters of students (each starting with its mentor), the total mentee to mentor distance, the
+    objective, wall time and stop reason of every restart and the stop reason of the kept restart
+    """
+    k = len(mentors)
+    kmeans = KMeansVariation(k=k, clusters=mentors, max_iter=100, seed=seed, n_init=n_init, n_jobs=n_jobs, probes=probes, time_budget_ms=time_budget_ms, tol=tol)
+    clusters = kmeans.fit(mentees)
+
+    restarts = [{key: restart[key] for key in ["seed", "objective", "iterations", "time", "stopped"]} for restart in kmeans.restarts]
+
+    debug = kmeans_debug(kmeans)
+    with timer(debug["timings"], "score"):
+        objective = score(clusters, mentors, mentees)
+
+    details = {"restarts": restarts, "stopped": kmeans.stopped, "debug": debug}
+    if keep:
+        details["checkpoint"] = kmeans.checkpoint()
+
+    return clusters, objective, details
+
+def kmeans_debug(kmeans: KMeansVariation) -> dict:
+    """
+    Collect the instrumentation of a k-means fit
+
+    :param kmeans: The fitted k-means
+    :return: dict holding the seconds spent in each phase and the counters summed over all restarts, the iterations
+    of every restart and the objective after every iteration of the kept restart
+    """
+    return {
+        "timings": dict(kmeans.timings),
+        "counters": dict(kmeans.counters),
+        "iterations": [restart["iterations"] for restart in kmeans.restarts],
+        "objectives": list(kmeans.objectives),
+    }
+
+def score(clusters: list[list[Student]], mentors: list[Student], mentees: list[Student]) -> float:
+    """
+    Score clusters the same way as the exact engine so results of every engine can be compared
+
+    :param clusters: Clusters of students, each starting with its mentor
+    :param mentors: The mentors of the clusters
+    :param mentees: The mentees in the clusters
+    :return: The total mentee to mentor distance
+    """
+    distances = mentor_distances(mentees, mentors)
+    index = {id(mentee): i for i, mentee in enumerate(mentees)}
+    objective = sum(distances[index[id(mentee)], i] for i, cluster in enumerate(clusters) for mentee in cluster[1:])
+
+    return float(objective)
+
+def pair_exact(mentors: list[Student], mentees: list[Student], **options):
+    """
+    Pair mentees with mentors by solving the capacitated assignment exactly. Each mentor takes at most their
+    `mentee_limit` mentees, or an even share of the mentees if no limit was given. The result is deterministic,
+    so k-means options are ignored
+
+    :return: clusters of students (each starting with its mentor), the total mentee to mentor distance and the
+    instrumentation of the solve
+    """
+    default = default_capacity(len(mentees), len(mentors))
+    capacities = [default if mentor.mentee_limit == None else mentor.mentee_limit for mentor in mentors]
+
+    timings = {}
+    with timer(timings, "distances"):
+        distances = mentor_distances(mentees, mentors)
+    with timer(timings, "assignment"):
+        labels, objective = capacitated_assignment(distances, capacities)
+
+    clusters = [[mentor] for mentor in mentors]
+    for mentee, label in zip(mentees, labels):
+        clusters[label].append(mentee)
+
+    return clusters, objective, {"debug": {"timings": timings, "counters": {"comparisons": len(mentees) * len(mentors)}}}
+
+# Engines that can be selected when creating pairs
+engines = {
+    "kmeans": pair_kmeans,
+    "exact": pair_exact,
+}
+
+def result_key(models: list[StudentModel], engine: str, options: dict) -> str:
+    """
+    Hash a pairing request, so requests that would give the same pairs share one cache entry
+
+    :param models: The students to pair, in the order they are paired
+    :param engine: The name of the engine to use (see `engines`)
+    :param options: Options passed to `pair` and the engine
+    :return: Hex digest of the students, the engine, the options that change the result and the word vectors used
+    """
+    request = {
+        "version": result_version,
+        "model": [utils.store_path, utils.projection_method, utils.projection_dim, utils.projection_seed],
+        "engine": engine,
+        "options": {key: value for key, value in options.items() if key not in uncached_options},
+        "students": [model.model_dump(mode="json") for model in models],
+    }
+
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def pair_students(models: list[StudentModel], engine: str = "kmeans", cache: bool = True, **options) -> dict:
+    """
+    Pair student models with the selected engine. Results are cached (see `results`), so a request that was
+    already answered is served before any student is embedded
+
+    :param models: The students to pair
+    :param engine: The name of the engine to use (see `engines`)
+    :param cache: Whether a cached result can be served. The new result is stored either way
+    :param options: Options passed to `pair` and the engine
+    :return: dict holding the names in each pair, the engine, the objective, any details the engine reports and
+    whether the result came from the cache under "cache". A served result only has an id if its assignment is still
+    kept by this process, otherwise "cache" says it can't be repaired
+    """
+    # Mentors go first so the k-means members (mentors, then mentees) are the packed cohort's rows in order and
+    # can be used without copying them
+    models = sorted(models, key=lambda model: model.role != "mentor")
+
+    timings = {}
+    with timer(timings, "cache"):
+        key = result_key(models, engine, options)
+        entry = results.get(key) if cache else None
+
+    if entry is not None:
+        result = entry["result"]
+
+        # The assignment of a served result can be repaired as long as this process still keeps it. After a
+        # restart or once it is forgotten, the pairs are served without an id
+        id = result_assignments.get(key)
+        repairable = id is not None and assignments.get(id) is not None
+        if options.get("keep") and repairable:
+            result["id"] = id
+
+        result["cache"] = {"hit": True, "key": key, "saved_seconds": entry["seconds"], "hit_rate": results.stats()["hit_rate"], "repairable": repairable}
+        result["debug"] = {"timings": timings, "counters": {}, "iterations": []}
+        return result
+
+    start = time.perf_counter()
+    with timer(timings, "vectorize"):
+        students = Student.from_models(models)
+
+    # A time budget covers the whole pairing, so embedding the answers uses part of it
+    budget = options.get("time_budget_ms")
+    if budget is not None:
+        options["time_budget_ms"] = max(budget - timings["vectorize"] * 1000, 0)
+
+    result = pair(students, engine, **options)
+    result["debug"]["timings"].update(timings)
+    seconds = time.perf_counter() - start
+
+    # Results cut short by a time budget depend on how fast this run was, so they are not stored
+    if budget is None or seconds * 1000 < budget:
+        results.put(key, {"result": {name: value for name, value in result.items() if name not in ["debug", "id"]}, "seconds": seconds})
+        if "id" in result:
+            result_assignments.put(key, result["id"])
+    result["cache"] = {"hit": False, "key": key, "saved_seconds": 0.0, "hit_rate": results.stats()["hit_rate"], "repairable": "id" in result}
+
+    return result
+
+def pair(students: list[Student], engine: str = "kmeans", keep: bool = False, **options) -> dict:
+    """
+    Split students into mentors and mentees and pair them with the selected engine
+
+    :param students: The students to pair
+    :param engine: The name of the engine to use (see `engines`)
+    :param keep: Whether to keep the assignment so it can be updated with `repair`
+    :param options: Options passed to the engine
+    :raises ValueError: if there are no mentors or the engine can't pair the students
+    :return: dict holding the names in each pair, the engine, the objective, any details the engine reports and the
+    instrumentation of the pairing under "debug". Kept assignments also include their id
+    """
+    result, clusters = pair_clusters(students, engine, keep=keep, **options)
+    checkpoint = result.pop("checkpoint", None)
+    if keep:
+        result["id"] = remember(Assignment.from_clusters(clusters, checkpoint))
+
+    return result
+
+def pair_clusters(students: list[Student], engine: str = "kmeans", **options) -> tuple[dict, list[list[Student]]]:
+    """
+    Pair students like `pair`, also returning the clusters of students
+
+    :return: The result (see `pair`) and the clusters of students, each starting with its mentor
+    """
+    mentors = []
+    mentees = []
+    for student in students:
+        if student.role == "mentor":
+            mentors.append(student)
+        else:
+            mentees.append(student)
+
+    if len(mentors) == 0:
+        raise ValueError("at least one mentor is needed to create pairs")
+
+    # Group the students using the selected engine
+    timings = {}
+    with timer(timings, "engine"):
+        clusters, objective, details = engines[engine](mentors, mentees, **options)
+    details["debug"]["timings"].update(timings)
+
+    return {"pairs": names(clusters), "engine": engine, "objective": objective, **details}, clusters
+
+def pair_cohort(students: list[Student], engine: str, options: dict) -> dict:
+    """
+    Pair one cohort of a batch. Only plain data is returned, so the outcome can be sent back from a worker process
+
+    :param students: The students of the cohort
+    :param engine: The name of the engine to use (see `engines`)
+    :param options: Options passed to the engine
+    :return: dict holding the result (see `pair`), the clusters as positions in `students` and the seconds it took,
+    or the error if the cohort couldn't be paired
+    """
+    start = time.perf_counter()
+    try:
+        result, clusters = pair_clusters(students, engine, **options)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    index = {id(student): i for i, student in enumerate(students)}
+    positions = [[index[id(student)] for student in cluster] for cluster in clusters]
+
+    return {"result": result, "positions": positions, "time": time.perf_counter() - start}
+
+def pair_batch(cohorts: dict[str, list[StudentModel]], engine: str = "kmeans", keep: bool = False, n_jobs: int = 1, **options) -> dict:
+    """
+    Pair many named cohorts at once. Every cohort is vectorized in one pass, so text shared between cohorts is only
+    embedded once, and the cohorts are then paired in the shared worker pool (see `jobs.shared_pool`), largest first
+
+    :param cohorts: The students of every cohort, by name
+    :param engine: The name of the engine to use (see `engines`)
+    :param keep: Whether to keep the assignments so they can be updated with `repair`
+    :param n_jobs: The largest number of cohorts paired at once
+    :param options: Options passed to the engine. Restarts run serially inside each cohort
+    :return: dict holding the engine, the result of every cohort by name (or its error) and the instrumentation of the
+    whole batch under "debug"
+    """
+    timings = {}
+
+    # Mentors go first in each cohort and cohorts follow each other, so every cohort is a run of the packed rows
+    with timer(timings, "vectorize"):
+        ordered = {name: sorted(models, key=lambda model: model.role != "mentor") for name, models in cohorts.items()}
+        students = Student.from_models([model for models in ordered.values() for model in models])
+
+    # Every cohort gets its own view of its packed rows, so a worker is only sent the rows of the cohort it pairs
+    groups = {}
+    start = 0
+    for name, models in ordered.items():
+        rows = students[start].cohort.take(slice(start, start + len(models))) if len(models) > 0 else None
+        groups[name] = [Student(model=model, cohort=rows, row=i) for i, model in enumerate(models)]
+        start += len(models)
+
+    # The largest cohorts start first, so the smaller ones fill in around them and the batch takes about as long as
+    # its largest cohort
+    cohort_options = {**options, "n_jobs": 1}
+    order = sorted(groups, key=lambda name: len(groups[name]), reverse=True)
+    tasks = [(groups[name], engine, cohort_options) for name in order]
+
+    with timer(timings, "fit"):
+        n_jobs = min(n_jobs, len(tasks))
+        if n_jobs <= 1:
+            outcomes = [batch_worker(task) for task in tasks]
+        else:
+            outcomes = jobs.run_parallel(batch_worker, tasks, n_jobs)
+
+    # Collect the results in the order the cohorts were given, along with the work done by all of them
+    outcomes = dict(zip(order, outcomes))
+    debug = {"timings": timings, "counters": {}, "iterations": []}
+    results = {}
+    for name in cohorts:
+        outcome = outcomes[name]
+        if "error" in outcome:
+            results[name] = {"error": outcome["error"]}
+            continue
+
+        result = outcome["result"]
+        result["time"] = outcome["time"]
+        if keep:
+            clusters = [[groups[name][i] for i in cluster] for cluster in outcome["positions"]]
+            result["id"] = remember(Assignment.from_clusters(clusters))
+
+        for counter, count in result["debug"].get("counters", {}).items():
+            debug["counters"][counter] = debug["counters"].get(counter, 0) + count
+        debug["iterations"] += result["debug"].get("iterations", [])
+        timings["engine"] = timings.get("engine", 0.0) + result["debug"]["timings"]["engine"]
+
+        results[name] = result
+
+    return {"engine": engine, "cohorts": results, "debug": debug}
+
+def names(clusters: list[list[Student]]) -> list[list[str]]:
+    """
+    Group students' names into pairs using the clusters
+
+    :param clusters: Clusters of students, each starting with its mentor
+    :return: The names in each pair
+    """
+    pairs = []
+    for i, cluster in enumerate(clusters):
+        pairs.append([student.name for student in cluster])
+
+    return pairs
+
+def remember(assignment: Assignment) -> str:
+    """
+    Keep an assignment so it can be updated with `repair`
+
+    :param assignment: The assignment to keep
+    :return: The id of the assignment
+    """
+    id = uuid.uuid4().hex
+    assignments.put(id, assignment)
+
+    return id
+
+def repair(assignment_id: str, delta: CohortDelta, threshold: float = 0.0) -> dict:
+    """
+    Update a kept assignment after students joined or left the cohort. Only the new students are embedded and
+    packed, and k-means starts from the checkpoint of the previous pairs, so existing pairs stay the same unless
+    their mentor left, their pair is over capacity or moving them into a pair that changed gains more than
+    `threshold`. Only mentees in pairs that changed are compared with every mentor
+
+    :param assignment_id: The id of the kept assignment
+    :param delta: The students that joined, and the names of the students that left
+    :param threshold: The distance (between 0 and 1) a mentee has to gain before it moves to another mentor
+    :raises KeyError: if the assignment is unknown or was forgotten
+    :raises ValueError: if no mentors are left
+    :return: dict holding the names in each pair, the engine, the objective, the number of kept mentees that moved,
+    the id of the updated assignment and the instrumentation of the update
+    """
+    previous = assignments.get(assignment_id)
+    if previous is None:
+        raise KeyError(assignment_id)
+
+    removed = set(delta.removed)
+
+    timings = {}
+    with timer(timings, "vectorize"):
+        added = Student.from_models(delta.added)
+
+    # Mentors that stayed keep their position, new mentors start empty pairs
+    positions = np.full(len(previous.mentors), -1, dtype=np.int64)
+    mentors = []
+    for i, mentor in enumerate(previous.mentors):
+        if mentor.name not in removed:
+            positions[i] = len(mentors)
+            mentors.append(mentor)
+    mentors += [student for student in added if student.role == "mentor"]
+    if len(mentors) == 0:
+        raise ValueError("no mentors are left to pair with")
+
+    # Mentees whose mentor left are placed again like new mentees
+    kept = [i for i, mentee in enumerate(previous.mentees) if mentee.name not in removed]
+    mentees = [previous.mentees[i] for i in kept] + [student for student in added if student.role != "mentor"]
+    labels = np.concatenate([positions[previous.labels[kept]], np.full(len(mentees) - len(kept), -1, dtype=np.int64)])
+
+    # Distances to the previous mentors are found while the previous students still share their cohort
+    with timer(timings, "score"):
+        previous_distances = previous.distances_to_mentors()
+
+    kmeans = KMeansVariation(k=len(mentors), clusters=mentors)
+    with timer(timings, "engine"):
+        clusters = kmeans.refit(mentees, labels, threshold, previous.take_checkpoint())
+        checkpoint = kmeans.checkpoint()
+
+    # Students now live in the rows of the checkpoint, so the cohorts they were embedded in can be freed and the
+    # next update packs them without copying
+    cohort = checkpoint.cohort()
+    for row, student in enumerate(checkpoint.values):
+        if student is not None:
+            student.cohort = cohort
+            student.row = row
+
+    current = Assignment.from_clusters(clusters, checkpoint)
+
+    # Count the mentees that were paired before and now have another mentor, and only compare the mentees whose
+    # mentor changed with their mentor
+    debug = kmeans_debug(kmeans)
+    debug["timings"].update(timings)
+    with timer(debug["timings"], "score"):
+        previous_mentors = {id(mentee): previous.mentors[label] for mentee, label in zip(previous.mentees, previous.labels)}
+        previous_distances = {id(mentee): distance for mentee, distance in zip(previous.mentees, previous_distances)}
+        index = {id(mentee): i for i, mentee in enumerate(current.mentees)}
+        moved = sum(1 for i, label in enumerate(labels) if label >= 0 and current.labels[index[id(mentees[i])]] != label)
+
+        current.distances = np.zeros(len(current.mentees))
+        changed = []
+        for i, (mentee, label) in enumerate(zip(current.mentees, current.labels)):
+            if previous_mentors.get(id(mentee)) is current.mentors[label]:
+                current.distances[i] = previous_distances[id(mentee)]
+            else:
+                changed.append(i)
+        current.distances[changed] = pair_distances([current.mentees[i] for i in changed], [current.mentors[current.labels[i]] for i in changed])
+        objective = float(current.distances.sum())
+
+    return {
+        "pairs": names(clusters),
+        "engine": "kmeans",
+        "objective": objective,
+        "moved": moved,
+        "id": remember(current),
+        "debug": debug,
+    }
@@ -22,21 +22,51 @@ weights = {
 
 weights_sum = sum(weights.values())
 
+# How each field is compared: "text" fields by the cosine closeness of their embeddings, every other field as an enum
+# with the given number of values
+comparison_kinds = {
+    "class_year": 4,
+    "major": "text",
+    "minor": "text",
+    "high_school": len(HighSchoolEnum),
+    "lead_conversation": len(LeadConversationEnum),
+    "academic_goals": "text",
+    "professional_goals": "text",
+    "frequency": len(FrequencyEnum),
+    "involved_off_campus": "text",
+    "involved_on_campus": "text",
+    "curious": "text",
+    "background": "text",
+    "gender": "text",
+    "description": "text",
+    "identities": "text",
+}
+
+def by_kind(text_method, enum_method) -> dict:
+    """
+    Build a table of comparison methods from `comparison_kinds`
+
+    :param text_method: The method used for text fields
+    :param enum_method: Factory returning the method used for an enum field, given its number of values
+    :return: dict mapping each field to its comparison method
+    """
+    return {key: text_method if kind == "text" else enum_method(kind) for key, kind in comparison_kinds.items()}
+
+# Fields of a StudentModel that hold free text, in the order they are embedded
+text_fields = [key for key, kind in comparison_kinds.items() if kind == "text"]
+
 # Methods used to compare each field
-methods = {
-    "class_year": comparisons.enum_comparison(4),
-    "major": comparisons.text_comparison,
-    "minor": comparisons.text_comparison,
-    "high_school": comparisons.enum_comparison(len(HighSchoolEnum)),
-    "lead_conversation": comparisons.enum_comparison(len(LeadConversationEnum)),
-    "academic_goals": comparisons.text_comparison,
-    "professional_goals": comparisons.text_comparison,
-    "frequency": comparisons.enum_comparison(len(FrequencyEnum)),
-    "involved_off_campus": comparisons.text_comparison,
-    "involved_on_campus": comparisons.text_comparison,
-    "curious": comparisons.text_comparison,
-    "background": comparisons.text_comparison,
-    "gender": comparisons.text_comparison,
-    "description": comparisons.text_comparison,
-    "identities": comparisons.text_comparison,
-}
\ No newline at end of file
+methods = by_kind(comparisons.text_comparison, comparisons.enum_comparison)
+
+# Matrix versions of `methods`, used when comparing whole cohorts at once. Packed text vectors are unit length (see `normalized_fields`)
+matrix_methods = by_kind(comparisons.unit_text_comparison_matrix, comparisons.enum_comparison_matrix)
+
+# Row by row versions of `matrix_methods`, used when every student is only compared with one other student
+row_methods = by_kind(comparisons.unit_text_comparison_rows, comparisons.enum_comparison_rows)
+
+# Fields compared by cosine closeness. Packed students keep these vectors at unit length, along with their original
+# length, so comparing them is a plain dot product
+normalized_fields = text_fields
+
+# Versions of `methods` for vectors of packed students, where the vectors of `normalized_fields` are unit length
+unit_methods = by_kind(comparisons.unit_text_comparison, comparisons.enum_comparison)
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from embeddings import VectorStore, vectors_file, vocab_file, order_file
+
+# Ways the word vectors can be reduced to fewer dimensions
+methods = ["pca", "random"]
+
+# File the projection matrix is saved to inside a projected store directory
+matrix_file = "projection.npy"
+
+# Number of words PCA is fitted on. Word2vec files list the most frequent words first, so these are the words
+# survey answers are most likely to use
+fit_words = 200000
+
+# Number of word vectors projected at once, so the full matrix is never read into memory
+chunk_size = 65536
+
+def fit_pca(vectors: np.ndarray[any], dim: int) -> np.ndarray[any]:
+    """
+    Find the directions that keep as much of the word vectors as possible. The vectors are not centered, so
+    projecting onto the directions is a plain orthogonal projection and cosine similarities change as little as
+    possible
+
+    :param vectors: (n, d) matrix of word vectors, the first `fit_words` rows are used
+    :param dim: The number of directions to keep
+    :return: (d, dim) projection matrix
+    """
+    rows = min(len(vectors), fit_words)
+
+    gram = np.zeros((vectors.shape[1], vectors.shape[1]))
+    for start in range(0, rows, chunk_size):
+        block = np.asarray(vectors[start:min(start + chunk_size, rows)], dtype=np.float64)
+        gram += block.T @ block
+
+    # Eigenvectors come in increasing order of their eigenvalue
+    _, directions = np.linalg.eigh(gram)
+
+    return np.ascontiguousarray(directions[:, ::-1][:, :dim], dtype=np.float32)
+
+def random_projection(size: int, dim: int, seed: int = 0) -> np.ndarray[any]:
+    """
+    Make a fixed Gaussian random projection, which keeps dot products between vectors close on average
+
+    :param size: The size of the word vectors
+    :param dim: The size of the projected vectors
+    :param seed: Seed for the projection, the same seed always gives the same matrix
+    :return: (size, dim) projection matrix
+    """
+    rng = np.random.default_rng(seed)
+
+    return (rng.standard_normal((size, dim)) / np.sqrt(dim)).astype(np.float32)
+
+def fit(vectors: np.ndarray[any], method: str, dim: int, seed: int = 0) -> np.ndarray[any]:
+    """
+    Make the projection matrix of a method
+
+    :param vectors: (n, d) matrix of word vectors
+    :param method: The method to use (see `methods`)
+    :param dim: The size of the projected vectors
+    :param seed: Seed for random projections
+    :raises ValueError: if the method is unknown or the dimension is not between 1 and d
+    :return: (d, dim) projection matrix
+    """
+    if method not in methods:
+        raise ValueError(f"unknown projection '{method}', expected one of {', '.join(methods)}")
+    if dim < 1 or dim > vectors.shape[1]:
+        raise ValueError(f"projection dimension must be between 1 and {vectors.shape[1]}, got {dim}")
+
+    if method == "pca":
+        return fit_pca(vectors, dim)
+
+    return random_projection(vectors.shape[1], dim, seed)
+
+def project(vectors: np.ndarray[any], matrix: np.ndarray[any], out: np.ndarray[any]|None = None) -> np.ndarray[any]:
+    """
+    Project word vectors a chunk at a time
+
+    :param vectors: (n, d) matrix of word vectors
+    :param matrix: (d, dim) projection matrix
+    :param out: (n, dim) array to write the projected vectors to, a new array is made if not given
+    :return: (n, dim) matrix of projected vectors
+    """
+    if out is None:
+        out = np.empty((len(vectors), matrix.shape[1]), dtype=np.float32)
+
+    for start in range(0, len(vectors), chunk_size):
+        end = min(start + chunk_size, len(vectors))
+        out[start:end] = np.asarray(vectors[start:end], dtype=np.float32) @ matrix
+
+    return out
+
+def project_store(store: VectorStore, matrix: np.ndarray[any], path: str) -> VectorStore:
+    """
+    Write a projected copy of a store. The copy is written next to its final location and moved into place
+    once it is complete, so processes starting at the same time never load a half-written store
+
+    :param store: The store to project
+    :param matrix: (d, dim) projection matrix
+    :param path: The directory to write the projected store to
+    :return: The projected store, memory-mapped from `path`
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    staging = tempfile.mkdtemp(dir=parent, prefix=".projecting-")
+    try:
+        vectors = np.lib.format.open_memmap(os.path.join(staging, vectors_file), mode="w+", dtype=np.float32, shape=(len(store), matrix.shape[1]))
+        project(store.vectors, matrix, out=vectors)
+        vectors.flush()
+        del vectors
+
+        np.save(os.path.join(staging, vocab_file), np.asarray(store.vocab))
+        np.save(os.path.join(staging, order_file), np.asarray(store.order))
+        np.save(os.path.join(staging, matrix_file), matrix)
+
+        os.rename(staging, path)
+    except OSError:
+        # Another process finished the same store first
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return VectorStore.load(path)
+
+def project_model(model, method: str, dim: int, store_path: str, seed: int = 0):
+    """
+    Reduce the word vectors of a loaded model. Projected stores are saved next to the original store the first
+    time they are made and only loaded afterwards. Models read from a word2vec file are projected in memory
+
+    :param model: The loaded model, either a VectorStore or gensim KeyedVectors
+    :param method: The method to use (see `methods`)
+    :param dim: The size of the projected vectors
+    :param store_path: The directory of the original store
+    :param seed: Seed for random projections
+    :return: The model with projected word vectors
+    """
+    if isinstance(model, VectorStore):
+        path = f"{store_path}-{method}{dim}" if method == "pca" else f"{store_path}-{method}{dim}-{seed}"
+        if os.path.isdir(path):
+            return VectorStore.load(path)
+
+        return project_store(model, fit(model.vectors, method, dim, seed), path)
+
+    model.vectors = project(model.vectors, fit(model.vectors, method, dim, seed))
+    model.vector_size = dim
+
+    return model
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+from embeddings import VectorStore
+from parameters import text_fields
+
+# Words the backend can look up. Answers are lowercased and split on anything but letters before lookup (see
+# `utils.tokenize`), so words with capitals, digits or underscores can never be used
+usable_word = re.compile(r"[a-z]+")
+
+# Number of OOV tokens listed per field in the coverage report
+report_tokens = 25
+
+def load_source(source: str) -> tuple[list[str], np.ndarray[any]]:
+    """
+    Open the model to prune
+
+    :param source: A converted store directory or a word2vec binary file
+    :return: The words in the order of the model (most frequent first) and their vectors
+    """
+    if os.path.isdir(source):
+        store = VectorStore.load(source)
+
+        # The vocabulary is sorted, `order` maps it back to the rows of the model
+        words = [""] * len(store)
+        for word, row in zip(store.vocab.tolist(), store.order.tolist()):
+            words[row] = word.decode("utf-8")
+
+        return words, store.vectors
+
+    from gensim.models import KeyedVectors
+
+    model = KeyedVectors.load_word2vec_format(source, binary=True)
+    return model.index_to_key, model.vectors
+
+def read_common_words(path: str) -> frozenset[str]:
+    """
+    Read the common words filtered out of every answer
+
+    :param path: The common words list, one word per line
+    :return: The common words
+    """
+    with open(path) as f:
+        return frozenset(word.lower().strip() for word in f.readlines())
+
+def corpus_tokens(paths: list[str], common_words: frozenset[str]) -> dict[str, Counter]:
+    """
+    Count the tokens of every text field in past survey CSVs
+
+    :param paths: The survey CSVs. Their header row names the fields, like the uploads of `/api/v1/pairs/upload`
+    :param common_words: Words that are filtered out of every answer
+    :return: For each text field, the number of times every token was used
+    """
+    tokens = {field: Counter() for field in text_fields}
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                for field in text_fields:
+                    for token in usable_word.findall((record.get(field) or "").lower()):
+                        if token not in common_words:
+                            tokens[field][token] += 1
+
+    return tokens
+
+def select_words(words: list[str], top: int, corpus: dict[str, Counter], common_words: frozenset[str]) -> list[int]:
+    """
+    Choose the rows of the model to keep
+
+    :param words: The words of the model, most frequent first
+    :param top: The number of most frequent usable words to keep
+    :param corpus: For each text field, the tokens used in past surveys
+    :param common_words: Words that are filtered out of every answer, so they are never kept
+    :return: The rows to keep, in the order of the model
+    """
+    rows = set()
+    index = {}
+    for row, word in enumerate(words):
+        if word in common_words or not usable_word.fullmatch(word) or word in index:
+            continue
+
+        index[word] = row
+        if len(rows) < top:
+            rows.add(row)
+
+    for tokens in corpus.values():
+        rows.update(index[token] for token in tokens if token in index)
+
+    return sorted(rows)
+
+def coverage(corpus: dict[str, Counter], kept: set[str], known: set[str]) -> dict:
+    """
+    Measure how many corpus tokens the pruned model can embed
+
+    :param corpus: For each text field, the tokens used in past surveys
+    :param kept: The words of the pruned model
+    :param known: The usable words of the full model
+    :return: For each text field, the number of tokens, the number and share of out-of-vocabulary tokens, how many
+    of those the full model doesn't know either and the most common out-of-vocabulary tokens
+    """
+    report = {}
+    for field, tokens in corpus.items():
+        total = sum(tokens.values())
+        missing = Counter({token: count for token, count in tokens.items() if token not in kept})
+        unknown = sum(count for token, count in missing.items() if token not in known)
+
+        report[field] = {
+            "tokens": total,
+            "distinct": len(tokens),
+            "oov": sum(missing.values()),
+            "oov_share": sum(missing.values()) / total if total else 0.0,
+            "oov_in_full_model": unknown,
+            "top_oov": missing.most_common(report_tokens),
+        }
+
+    return report
+
+def prune(source: str, output: str, top: int, corpus_paths: list[str], common_path: str, check_paths: list[str] = []) -> dict:
+    """
+    Write a pruned copy of a model as a converted store (see `embeddings.py`)
+
+    :param source: A converted store directory or a word2vec binary file
+    :param output: The directory to write the pruned store to
+    :param top: The number of most frequent usable words to keep
+    :param corpus_paths: Survey CSVs whose words are always kept
+    :param common_path: The common words list, these words are never kept
+    :param check_paths: Survey CSVs the coverage is measured on. Words of the corpus are always kept, so surveys that
+    weren't part of it show how well the pruned store covers future answers. Defaults to the corpus
+    :return: The coverage report of the pruned store
+    """
+    words, vectors = load_source(source)
+    common_words = read_common_words(common_path)
+    corpus = corpus_tokens(corpus_paths, common_words)
+
+    rows = select_words(words, top, corpus, common_words)
+    VectorStore.save(output, [words[row] for row in rows], np.asarray(vectors[rows]))
+
+    kept = set(words[row] for row in rows)
+    known = set(word for word in words if usable_word.fullmatch(word))
+
+    return {
+        "source": source,
+        "words": len(rows),
+        "source_words": len(words),
+        "bytes": sum(os.path.getsize(os.path.join(output, name)) for name in os.listdir(output)),
+        "fields": coverage(corpus_tokens(check_paths, common_words) if check_paths else corpus, kept, known),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a small embedding store holding only the words survey answers use")
+    parser.add_argument("source", help="converted store directory or word2vec binary file to prune")
+    parser.add_argument("output", help="directory to write the pruned store to")
+    parser.add_argument("--top", type=int, default=20000, help="number of most frequent words to keep")
+    parser.add_argument("--corpus", nargs="*", default=[], help="survey CSVs whose words are always kept")
+    parser.add_argument("--check", nargs="*", default=[], help="survey CSVs to measure coverage on (default: the corpus)")
+    parser.add_argument("--common", help="common words that are never kept (default: common.txt next to the source)")
+    parser.add_argument("--report", help="write the coverage report to this JSON file")
+    args = parser.parse_args()
+
+    common_path = args.common or os.path.join(os.path.dirname(os.path.abspath(args.source)), "common.txt")
+    report = prune(args.source, args.output, args.top, args.corpus, common_path, args.check)
+
+    print(f"kept {report['words']} of {report['source_words']} words ({report['bytes'] / 1e6:.1f} MB)")
+    for field, stats in report["fields"].items():
+        print(f"{field:<20} tokens={stats['tokens']:<8} oov={stats['oov_share']:.2%} (not in full model: {stats['oov_in_full_model']})")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
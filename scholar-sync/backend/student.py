@@ -1,5 +1,7 @@
+import numpy as np
 import utils
-from parameters import weights, weights_sum, methods
+from cohort import Cohort, dtype
+from parameters import weights, weights_sum, unit_methods, text_fields
 from pydantic import BaseModel
 from kmeans import KMeansVariation
 from enums import *
@@ -34,15 +36,26 @@ class StudentModel(BaseModel):
 
 # Student class contains complicated behavior for kmeans analysis
 class Student():
-    def __init__(self, model: StudentModel|None = None, vectors=None):
+    # Students are created by the thousand, so they don't carry a per-instance __dict__. Their vectors are rows of a
+    # shared packed cohort rather than arrays of their own
+    __slots__ = ("name", "email", "role", "mentee_limit", "cohort", "row")
+
+    def __init__(self, model: StudentModel|None = None, vectors=None, cohort: Cohort|None = None, row: int|None = None):
         """
         Convert this student representation to an n-dimensional vector when first initialized
 
         :param model: The student model this student is based from
+        :param vectors: Already converted vectors for the model (see `vectorize`)
+        :param cohort: Packed cohort already holding the student's vectors (see `from_models`)
+        :param row: The student's row in `cohort`
         """
+        self.cohort = cohort
+        self.row = row
+
         # If no model is provided and vectors were, use those instead (for 'cluster average' students)
         if model == None and vectors != None:
-            self.vectors = vectors
+            self.cohort = Cohort.from_vectors([vectors])
+            self.row = 0
             return
 
         # Set static fields that aren't used for comparisons
@@ -52,41 +65,72 @@ class Student():
         self.role = model.role
         self.mentee_limit = model.mentee_limit
 
-        # Convert raw fields to vectors
-        class_year_vector = utils.num_to_vector(model.class_year)
-        major_vector = utils.string_to_vector(model.major)
-        minor_vector = utils.string_to_vector(model.minor)
-        high_school_vector = utils.enum_to_vector(model.high_school)
-        lead_conversation_vector = utils.enum_to_vector(model.lead_conversation)
-        academic_goals_vector = utils.string_to_vector(model.academic_goals)
-        professional_goals_vector = utils.string_to_vector(model.professional_goals)
-        frequency_vector = utils.enum_to_vector(model.frequency)
-        involved_off_campus_vector = utils.string_to_vector(model.involved_off_campus)
-        involved_on_campus_vector = utils.string_to_vector(model.involved_on_campus)
-        curious_vector = utils.string_to_vector(model.curious)
-        background_vector = utils.string_to_vector(model.background)
-        gender_vector = utils.string_to_vector(model.gender)
-        description_vector = utils.string_to_vector(model.description)
-        identities_vector = utils.string_to_vector(model.identities)
-
-        # Create a dict holding all vectors
-        self.vectors = {
-            "class_year": class_year_vector,
-            "major": major_vector,
-            "minor": minor_vector,
-            "high_school": high_school_vector,
-            "lead_conversation": lead_conversation_vector,
-            "academic_goals": academic_goals_vector,
-            "professional_goals": professional_goals_vector,
-            "frequency": frequency_vector,
-            "involved_off_campus": involved_off_campus_vector,
-            "involved_on_campus": involved_on_campus_vector,
-            "curious": curious_vector,
-            "background": background_vector,
-            "gender": gender_vector,
-            "description": description_vector,
-            "identities": identities_vector,
-        }
+        # Convert raw fields to vectors, packed as a cohort of one
+        if cohort == None:
+            if vectors == None:
+                vectors = Student.vectorize([model])[0]
+
+            self.cohort = Cohort.from_vectors([vectors])
+            self.row = 0
+
+    @staticmethod
+    def vectorize(models: list[StudentModel]) -> list[dict]:
+        """
+        Convert the raw fields of many student models to vectors. Identical text across the models is only
+        embedded once
+
+        :param models: The student models to convert
+        :return: dict of vectors for each model, in the same order
+        """
+        # Embed every distinct text in the cohort at once
+        texts = utils.strings_to_vectors([getattr(model, key) for model in models for key in text_fields])
+        texts = iter(texts)
+
+        results = []
+        for model in models:
+            major_vector = next(texts)
+            minor_vector = next(texts)
+            academic_goals_vector = next(texts)
+            professional_goals_vector = next(texts)
+            involved_off_campus_vector = next(texts)
+            involved_on_campus_vector = next(texts)
+            curious_vector = next(texts)
+            background_vector = next(texts)
+            gender_vector = next(texts)
+            description_vector = next(texts)
+            identities_vector = next(texts)
+
+            # Create a dict holding all vectors
+            results.append({
+                "class_year": utils.num_to_vector(model.class_year),
+                "major": major_vector,
+                "minor": minor_vector,
+                "high_school": utils.enum_to_vector(model.high_school),
+                "lead_conversation": utils.enum_to_vector(model.lead_conversation),
+                "academic_goals": academic_goals_vector,
+                "professional_goals": professional_goals_vector,
+                "frequency": utils.enum_to_vector(model.frequency),
+                "involved_off_campus": involved_off_campus_vector,
+                "involved_on_campus": involved_on_campus_vector,
+                "curious": curious_vector,
+                "background": background_vector,
+                "gender": gender_vector,
+                "description": description_vector,
+                "identities": identities_vector,
+            })
+
+        return results
+
+    @classmethod
+    def from_models(cls, models: list[StudentModel]):
+        """
+        Create students from many student models at once
+
+        :param models: The student models to convert
+        :return: list of students, in the same order. They share one packed cohort
+        """
+        cohort = Cohort.from_vectors(cls.vectorize(models))
+        return [cls(model=model, cohort=cohort, row=i) for i, model in enumerate(models)]
 
     def compare_to(self, s) -> float:
         """
@@ -98,44 +142,73 @@ class Student():
         a = self.to_vectors()
         b = s.to_vectors()
 
-        # Calculate differences in vectors and return their sum
+        # Calculate differences in vectors and return their sum. Text vectors are already unit length
         diffs = []
         for key in a:
             if len(a[key]) > 0 and len(b[key]) > 0:
-                diffs.append(weights[key] * methods[key](a[key], b[key]))
+                diffs.append(weights[key] * unit_methods[key](a[key], b[key]))
 
         return sum(diffs) / weights_sum
 
+    @classmethod
+    def pack(cls, students):
+        """
+        Pack students into contiguous per-field blocks for batched comparisons
+
+        :param students: The students to pack
+        :return: Cohort holding one row per student
+        """
+        # Students from the same cohort are selected from it directly, consecutive rows without copying them
+        if len(students) > 0 and all(student.cohort is students[0].cohort for student in students):
+            rows = np.fromiter((student.row for student in students), dtype=np.int64, count=len(students))
+            if np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+                return students[0].cohort.take(slice(rows[0], rows[0] + len(rows)))
+
+            return students[0].cohort.take(rows)
+
+        return Cohort.from_students(students)
+
+    @classmethod
+    def similarity_matrix(cls, students, others):
+        """
+        Compare every student in one list with every student in another list at once
+
+        :param students: The students to compare (rows of the result)
+        :param others: The students to compare them with (columns of the result)
+        :return: matrix where entry (i, j) equals `students[i].compare_to(others[j])`
+        """
+        return cls.pack(students).similarity(cls.pack(others))
+
     def average_with(self, students):
         """
         Find the average student based on this student and other provided students
 
         :param students: The students to compute this average with
         """
-        # Get the base vector
-        sum = self.to_vectors()
+        # Get the base vector at its original length. It is copied as it may be a view into a cohort
+        sum = {key: np.array(vector, dtype=dtype) for key, vector in self.to_vectors(scaled=True).items()}
 
         # Find the total sum
         for student in students:
-            vector = student.to_vectors()
+            vector = student.to_vectors(scaled=True)
             for key in vector:
-                for i in range(len(sum[key])):
-                    if len(vector[key]) > 0 and vector[key][i] != None:
-                        sum[key][i] += vector[key][i]
+                if len(vector[key]) > 0 and len(sum[key]) > 0:
+                    sum[key] += vector[key]
 
         # Divide each key by length for the average
         for key in sum:
-            sum[key] = [v / (len(students) + 1) for v in sum[key]]
+            sum[key] /= len(students) + 1
 
         return Student(vectors=sum)
     
-    def to_vectors(self):
+    def to_vectors(self, scaled: bool = False):
         """
         Return the vector representation of this student
 
+        :param scaled: Return text vectors at their original length instead of unit length
         :return: vector representation of this student
         """
-        return self.vectors
+        return self.cohort.vectors(self.row, scaled)
 
 
 if __name__ == "__main__":
@@ -1,55 +1,199 @@
 import re
 import numpy as np
 import os
-from gensim.models import KeyedVectors
+import threading
+from cache import LRUCache
+from embeddings import VectorStore
+from projection import project_model
 
 base_path = "scholar-sync/backend"
 #base_path = ""
 
-# Load the Word2Vec model
-path = os.path.join(os.getcwd(), base_path, "model", "word2vec-google-news-300.gz")
-model = KeyedVectors.load_word2vec_format(path, binary=True)
-
-# Load the common words library
-common_words = []
-with open(os.path.join(base_path, "model", "common.txt")) as f:
-    common_words = [word.lower().strip() for word in f.readlines()]
-
-# Turn a string into a vector representation based on the given model
+# Directory holding the Word2Vec model and the common words list. It can be moved through the environment
+model_dir = os.environ.get("MODEL_DIR", os.path.join(os.getcwd(), base_path, "model"))
+
+# Paths of the Word2Vec model. The memory-mapped store is preferred (see `embeddings.py`), the original
+# word2vec file is only parsed when no converted store exists. A pruned store (see `prune.py`) can be loaded
+# instead by naming its directory in EMBEDDING_STORE, either absolute or relative to the model directory
+path = os.path.join(model_dir, "word2vec-google-news-300.gz")
+store_path = os.path.join(model_dir, os.environ.get("EMBEDDING_STORE", "word2vec-google-news-300"))
+
+# Optional reduction of the word vectors to fewer dimensions (see `projection.py`). Set EMBEDDING_PROJECTION to
+# "pca" or "random" and EMBEDDING_DIM to the size of the reduced vectors
+projection_method = os.environ.get("EMBEDDING_PROJECTION", "")
+projection_dim = int(os.environ.get("EMBEDDING_DIM", 0))
+projection_seed = int(os.environ.get("EMBEDDING_PROJECTION_SEED", 0))
+
+# The model is loaded lazily by `load_model`, either on first use or by the `warm_up` thread
+model = None
+model_error = None
+model_ready = threading.Event()
+model_lock = threading.Lock()
+
+# Cache of text embeddings keyed on normalized text. Cached vectors are read-only so callers can't corrupt them
+embedding_cache = LRUCache(int(os.environ.get("EMBEDDING_CACHE_SIZE", 10000)))
+
+# Number of texts embedded together. Batches bound the memory used by the gathered token vectors
+embedding_batch_size = 2048
+
+# Shared read-only vector returned for missing values
+empty_vector = np.array([], dtype=np.float32)
+empty_vector.flags.writeable = False
+
+# Load the common words library into a set so membership checks are constant time
+common_words = frozenset()
+with open(os.path.join(model_dir, "common.txt")) as f:
+    common_words = frozenset(word.lower().strip() for word in f.readlines())
+
+# Load the Word2Vec model if it has not been loaded yet, blocking until it is available
+def load_model():
+    global model, model_error
+
+    with model_lock:
+        if model is None:
+            try:
+                if os.path.isdir(store_path):
+                    loaded = VectorStore.load(store_path)
+                else:
+                    from gensim.models import KeyedVectors
+                    loaded = KeyedVectors.load_word2vec_format(path, binary=True)
+
+                # The model is only published once it is projected, so a failed projection is never half applied
+                if projection_method:
+                    loaded = project_model(loaded, projection_method, projection_dim, store_path, projection_seed)
+                model = loaded
+            except Exception as e:
+                model_error = e
+                raise
+
+            model_error = None
+            model_ready.set()
+
+    return model
+
+# Start loading the Word2Vec model on a background thread so callers don't block on startup
+def warm_up() -> threading.Thread:
+    def target():
+        try:
+            load_model()
+        except Exception:
+            # The error is kept in `model_error` and reported by readiness checks
+            pass
+
+    thread = threading.Thread(target=target, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+# Return whether the Word2Vec model has finished loading
+def is_ready() -> bool:
+    return model_ready.is_set()
+
+# Split a string into lowercase word tokens
+def tokenize(str) -> list[str]:
+    return re.findall(r"[a-z]+", str.lower())
+
+# Normalize a string so that texts which tokenize the same share one cache entry
+def normalize_text(str) -> str:
+    return " ".join(tokenize(str))
+
+# Turn a string into a (read-only) vector representation based on the given model
 def string_to_vector(str) -> np.ndarray[any]:
     if str == None or str == "":
-        return np.array([])
-
-    # Tokenize the sentence
-    tokens = re.sub(r" +", "", re.sub(r"[^a-z ]+", " ", str.lower())).split(" ")
-    tokens = [token for token in tokens if not token in common_words]
-
-    # Get the vector representation for each token
-    token_vectors = []
-    for token in tokens:
-        if token in model:
-            token_vectors.append(model[token])
-
-    # If no tokens were found, return an empty array
-    if len(token_vectors) == 0:
-        return np.array([])
-
-    # Return the average of the token vector
-    return np.array(np.mean(token_vectors, axis=0))
+        return empty_vector
+
+    return strings_to_vectors([str])[0]
+
+# Turn many strings into (read-only) vectors. Each distinct text is looked up in the cache once and
+# every text that misses is embedded together in a single batch
+def strings_to_vectors(strs: list[str]) -> list[np.ndarray[any]]:
+    texts = ["" if s == None else normalize_text(s) for s in strs]
+
+    vectors = {"": empty_vector}
+    missing = []
+    for text in dict.fromkeys(texts):
+        if text == "":
+            continue
+
+        vector = embedding_cache.get(text)
+        if vector is None:
+            missing.append(text)
+        else:
+            vectors[text] = vector
+
+    for start in range(0, len(missing), embedding_batch_size):
+        batch = missing[start:start + embedding_batch_size]
+        for text, vector in zip(batch, texts_to_vectors(batch)):
+            vector.flags.writeable = False
+            embedding_cache.put(text, vector)
+            vectors[text] = vector
+
+    return [vectors[text] for text in texts]
+
+# Find the row of every token in the model's vector matrix (-1 for tokens the model doesn't know)
+def token_indices(model, tokens: list[str]) -> np.ndarray[any]:
+    if isinstance(model, VectorStore):
+        return model.lookup(tokens)
+
+    return np.array([model.key_to_index.get(token, -1) for token in tokens], dtype=np.int64)
+
+# Turn normalized texts into vector representations based on the given model. All tokens are gathered
+# from the model with one index and averaged per text with a segment reduction
+def texts_to_vectors(texts: list[str]) -> list[np.ndarray[any]]:
+    if len(texts) == 0:
+        return []
+
+    model = load_model()
+
+    # Tokenize every text into one flat token list, remembering which text each token came from
+    tokens = []
+    segments = []
+    for i, text in enumerate(texts):
+        for token in text.split(" "):
+            if token != "" and not token in common_words:
+                tokens.append(token)
+                segments.append(i)
+
+    # Look up each distinct token once and drop tokens the model doesn't know
+    vocab = list(dict.fromkeys(tokens))
+    vocab_indices = token_indices(model, vocab)
+    lookup = dict(zip(vocab, vocab_indices.tolist()))
+
+    indices = np.array([lookup[token] for token in tokens], dtype=np.int64)
+    segments = np.array(segments, dtype=np.int64)
+    found = indices >= 0
+    indices = indices[found]
+    segments = segments[found]
+
+    # Texts without any known token are represented by an empty array
+    results = [empty_vector for _ in texts]
+    if len(indices) == 0:
+        return results
+
+    # Average the token vectors of each text. Tokens are already grouped by text, so each group is a contiguous run
+    token_vectors = np.asarray(model.vectors[indices])
+    counts = np.bincount(segments, minlength=len(texts))
+    nonempty = np.flatnonzero(counts)
+    starts = np.concatenate(([0], np.cumsum(counts[nonempty])[:-1]))
+    means = np.add.reduceat(token_vectors, starts, axis=0) / counts[nonempty, None].astype(token_vectors.dtype)
+
+    for i, mean in zip(nonempty, means):
+        results[i] = mean.copy()
+
+    return results
 
 # Turn a number into a vector representation
 def num_to_vector(num):
     if num == None:
-        return np.array([])
+        return empty_vector
 
-    return np.array([num])
+    return np.array([num], dtype=np.float32)
 
 # Turn an enum into a vector representation (the value of the enum is in index 0 and the size of the enum is in index 1)
 def enum_to_vector(enum):
     if enum == None or enum.value == None:
-        return np.array([])
+        return empty_vector
 
-    return np.array([enum.value])
+    return np.array([enum.value], dtype=np.float32)
 
 """
 # Find the distance between two vectors
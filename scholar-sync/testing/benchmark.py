@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+# The backend modules are imported from their own folder, the same way the API runs them
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, backend_path)
+
+from embeddings import VectorStore
+
+# Stages timed for every cohort size, in pipeline order
+stages = ["vectorize", "seed", "distances", "assign", "update_centers", "optimize", "end_to_end"]
+
+# Syllables the stand-in vocabulary is built from. Words only use letters so they survive tokenization
+syllables = ["ba", "ce", "di", "fo", "gu", "ka", "le", "mi", "no", "pu", "ra", "se", "ti", "vo", "zu", "sha", "tre", "pli"]
+
+# Words written by survey respondents that are common enough to be filtered out
+stop_words = ["a", "an", "and", "i", "in", "of", "the", "to", "with"]
+
+def make_vocabulary(size: int, seed: int = 0) -> list[str]:
+    """
+    Make a vocabulary of distinct pseudo-words
+
+    :param size: The number of words
+    :param seed: Seed for the word shapes
+    :return: The words
+    """
+    rng = random.Random(seed)
+
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+
+    return sorted(words)
+
+def make_model(path: str, vocabulary: list[str], dim: int, seed: int = 0) -> None:
+    """
+    Write a small stand-in embedding model in the layout `utils` loads, so benchmarks run offline
+
+    :param path: The model directory to write
+    :param vocabulary: The words of the model
+    :param dim: The size of every word vector
+    :param seed: Seed for the word vectors
+    """
+    rng = np.random.default_rng(seed)
+    VectorStore.save(os.path.join(path, "word2vec-google-news-300"), vocabulary, rng.standard_normal((len(vocabulary), dim)))
+
+    with open(os.path.join(path, "common.txt"), "w") as f:
+        f.write("\n".join(stop_words))
+
+def make_cohort(n: int, mentor_ratio: float, sparsity: float, vocabulary: list[str], seed: int = 0) -> list[dict]:
+    """
+    Generate a synthetic cohort of survey answers
+
+    :param n: The number of students
+    :param mentor_ratio: The share of students that are mentors
+    :param sparsity: The chance that any optional field is left empty
+    :param vocabulary: The words text answers are drawn from
+    :param seed: Seed for the answers, the same seed always gives the same cohort
+    :return: The students as JSON-friendly dicts accepted by `StudentModel`
+    """
+    rng = random.Random(seed)
+    mentors = max(1, round(n * mentor_ratio))
+
+    # Some words are much more popular than others, like in real answers
+    popularity = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    def text():
+        if rng.random() < sparsity:
+            return ""
+
+        words = rng.choices(vocabulary, weights=popularity, k=rng.randint(1, 12))
+        words += rng.sample(stop_words, 2)
+        rng.shuffle(words)
+        return " ".join(words)
+
+    def option(count):
+        return None if rng.random() < sparsity else rng.randrange(count)
+
+    cohort = []
+    for i in range(n):
+        cohort.append({
+            "name": f"Student {i}",
+            "email": f"student{i}@example.com",
+            "role": "mentor" if i < mentors else "mentee",
+            "mentee_limit": None,
+            "class_year": rng.randint(2024, 2028),
+            "major": text(),
+            "minor": text(),
+            "high_school": option(2),
+            "lead_conversation": option(5),
+            "academic_goals": text(),
+            "professional_goals": text(),
+            "frequency": option(3),
+            "involved_off_campus": text(),
+            "involved_on_campus": text(),
+            "curious": text(),
+            "background": text(),
+            "gender": "" if rng.random() < sparsity else rng.choice(["male", "female", "nonbinary"]),
+            "description": text(),
+            "identities": text(),
+        })
+
+    return cohort
+
+def run_once(cohort: list[dict], client, seed: int, probes: int|None = None) -> dict:
+    """
+    Time every stage of pairing a cohort once
+
+    :param cohort: The cohort to pair
+    :param client: Test client of the API
+    :param seed: Seed for k-means
+    :param probes: The number of center index cells searched per student, or None to compare with every center
+    :return: The wall time of every stage in seconds
+    """
+    import utils
+    from kmeans import KMeansVariation
+    from student import Student, StudentModel
+
+    timings = {}
+    models = [StudentModel.model_validate(student) for student in cohort]
+
+    # Vectorize without help from answers embedded by earlier runs
+    utils.embedding_cache.clear()
+    start = time.perf_counter()
+    students = Student.from_models(models)
+    timings["vectorize"] = time.perf_counter() - start
+
+    mentors = [student for student in students if student.role == "mentor"]
+    mentees = [student for student in students if student.role != "mentor"]
+
+    # Time the k-means phases of one fit
+    kmeans = KMeansVariation(k=len(mentors), clusters=mentors, seed=seed, probes=probes)
+    kmeans.fit(mentees)
+    timings.update({stage: seconds for stage, seconds in kmeans.timings.items() if stage in stages})
+
+    # Time the whole request, including validation and serialization. Repeated runs send the same cohort, so the
+    # result cache is bypassed
+    utils.embedding_cache.clear()
+    start = time.perf_counter()
+    params = {"seed": seed, "cache": "false"} if probes is None else {"seed": seed, "cache": "false", "probes": probes}
+    response = client.post("/api/v1/pairs", params=params, json=cohort)
+    timings["end_to_end"] = time.perf_counter() - start
+    response.raise_for_status()
+
+    return timings
+
+def measure_memory(cohort: list[dict]) -> float:
+    """
+    Measure the memory kept per student once a cohort is vectorized and packed for k-means
+
+    :param cohort: The cohort to measure
+    :return: The number of bytes allocated per student, excluding the embedding cache
+    """
+    import utils
+    from student import Student, StudentModel
+
+    models = [StudentModel.model_validate(student) for student in cohort]
+    utils.embedding_cache.clear()
+
+    tracemalloc.start()
+    try:
+        students = Student.from_models(models)
+        packed = Student.pack([student for student in students if student.role == "mentor"] + [student for student in students if student.role != "mentor"])
+        utils.embedding_cache.clear()
+        allocated, _ = tracemalloc.get_traced_memory()
+
+        # The students and their packed cohort only had to stay alive until the snapshot above
+        del students, packed
+    finally:
+        tracemalloc.stop()
+
+    return allocated / len(models)
+
+def run(sizes: list[int], mentor_ratio: float, sparsity: float, repeat: int, vocabulary: list[str], seed: int, probes: int|None = None) -> list[dict]:
+    """
+    Benchmark every cohort size, keeping the median time of every stage
+
+    :return: One result per cohort size
+    """
+    import api
+    import utils
+    from fastapi.testclient import TestClient
+
+    utils.load_model()
+
+    results = []
+    with TestClient(api.app) as client:
+        for n in sizes:
+            cohort = make_cohort(n, mentor_ratio, sparsity, vocabulary, seed)
+            runs = [run_once(cohort, client, seed, probes) for _ in range(repeat)]
+
+            result = {
+                "size": n,
+                "mentors": sum(1 for student in cohort if student["role"] == "mentor"),
+                "bytes_per_student": measure_memory(cohort),
+                "stages": {stage: statistics.median(timings.get(stage, 0.0) for timings in runs) for stage in stages},
+            }
+            results.append(result)
+
+            print(f"n={n:<7}" + " ".join(f"{stage}={result['stages'][stage]:.4f}s" for stage in stages) + f" memory={result['bytes_per_student'] / 1024:.1f}KiB/student", flush=True)
+
+    return results
+
+def compare(results: list[dict], baseline: dict, tolerance: float, floor: float) -> list[str]:
+    """
+    Find the stages that got slower than a baseline by more than a tolerance
+
+    :param results: The results of this run
+    :param baseline: A saved benchmark report
+    :param tolerance: The allowed slowdown, relative to the baseline time (0.25 allows 25% slower)
+    :param floor: Slowdowns smaller than this many seconds are ignored as noise
+    :return: A description of every regression
+    """
+    previous = {result["size"]: result["stages"] for result in baseline["results"]}
+
+    regressions = []
+    for result in results:
+        if result["size"] not in previous:
+            continue
+
+        for stage, seconds in result["stages"].items():
+            before = previous[result["size"]].get(stage)
+            if before is None:
+                continue
+
+            if seconds > before * (1 + tolerance) and seconds - before > floor:
+                regressions.append(f"n={result['size']} {stage}: {seconds:.4f}s vs {before:.4f}s baseline (+{(seconds / max(before, 1e-12) - 1) * 100:.0f}%)")
+
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the pairing pipeline on synthetic cohorts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000], help="cohort sizes to benchmark (up to 50000)")
+    parser.add_argument("--mentor-ratio", type=float, default=0.25, help="share of students that are mentors")
+    parser.add_argument("--sparsity", type=float, default=0.3, help="chance that an optional field is left empty")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the median time is reported")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="number of words in the stand-in model")
+    parser.add_argument("--dim", type=int, default=300, help="size of the stand-in word vectors")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the cohorts, the model and k-means")
+    parser.add_argument("--probes", type=int, help="center index cells searched per student (default: compare with every center)")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="fail if a stage is slower than in this saved report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown relative to the baseline")
+    parser.add_argument("--floor", type=float, default=0.01, help="slowdowns below this many seconds are ignored")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        # The backend reads the model location when it is first imported
+        vocabulary = make_vocabulary(args.vocabulary, args.seed)
+        make_model(model_dir, vocabulary, args.dim, args.seed)
+        os.environ["MODEL_DIR"] = model_dir
+
+        results = run(args.sizes, args.mentor_ratio, args.sparsity, args.repeat, vocabulary, args.seed, args.probes)
+
+    report = {
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "processor": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: getattr(args, key) for key in ["mentor_ratio", "sparsity", "repeat", "vocabulary", "dim", "seed", "probes"]},
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.floor)
+
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+import numpy as np
+
+# The backend modules are imported from their own folder, the same way the API runs them
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, backend_path)
+
+import comparisons
+from cohort import Cohort
+from parameters import weights, weights_sum, methods
+from benchmark import make_vocabulary, make_model
+
+def reference_text_comparison(a: np.ndarray[any], b: np.ndarray[any]) -> float:
+    """
+    The text comparison as it was first written, normalizing both vectors on every call. Kept to measure against
+    """
+    a_hat = a / sum([v**2 for v in a])**0.5
+    b_hat = b / sum([v**2 for v in b])**0.5
+
+    return float(np.dot(a_hat, b_hat))
+
+def reference_compare(a: dict, b: dict) -> float:
+    """
+    `Student.compare_to` on vectors at their original length, using `reference_text_comparison` for text
+    """
+    diffs = []
+    for key in a:
+        if len(a[key]) > 0 and len(b[key]) > 0:
+            method = reference_text_comparison if methods[key] is comparisons.text_comparison else methods[key]
+            diffs.append(weights[key] * method(a[key], b[key]))
+
+    return sum(diffs) / weights_sum
+
+def make_vectors(n: int, dim: int, rng: np.random.Generator) -> list[dict]:
+    """
+    Make random student vectors with every field present
+
+    :param n: The number of students
+    :param dim: The size of the text vectors
+    :param rng: The random generator to use
+    :return: dict of vectors for each student, like `Student.vectorize` returns
+    """
+    vectors = []
+    for _ in range(n):
+        student = {}
+        for key in weights:
+            if methods[key] is comparisons.text_comparison:
+                student[key] = rng.standard_normal(dim).astype(np.float32)
+            else:
+                student[key] = np.array([rng.integers(0, 3)], dtype=np.float32)
+        vectors.append(student)
+
+    return vectors
+
+def per_call(function, number: int) -> float:
+    """
+    Time a function, keeping the best of a few runs
+
+    :return: The microseconds taken per call
+    """
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+def run(dim: int, n: int, number: int) -> list[tuple]:
+    """
+    Time every kernel against the reference implementation
+
+    :param dim: The size of the text vectors
+    :param n: The number of students compared by the matrix kernels
+    :param number: The number of calls timed per run of the per-pair kernels
+    :return: The name, microseconds per pair, reference microseconds per pair and difference from the reference
+    score of every kernel
+    """
+    from student import Student
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(n, dim, rng)
+    cohort = Cohort.from_vectors(vectors)
+
+    a, b = vectors[0]["major"], vectors[1]["major"]
+    a_hat, b_hat = cohort.blocks["major"][0], cohort.blocks["major"][1]
+    students = [Student(vectors=v) for v in vectors[:2]]
+
+    # One text field, per pair
+    text = per_call(lambda: reference_text_comparison(a, b), number)
+    expected = reference_text_comparison(a, b)
+    texts = comparisons.unit_text_comparison_matrix(cohort.blocks["major"], cohort.blocks["major"])
+    rows = [
+        ("text, reference", text, text, 0.0),
+        ("text_comparison", per_call(lambda: comparisons.text_comparison(a, b), number), text, abs(comparisons.text_comparison(a, b) - expected)),
+        ("unit_text_comparison", per_call(lambda: comparisons.unit_text_comparison(a_hat, b_hat), number), text, abs(comparisons.unit_text_comparison(a_hat, b_hat) - expected)),
+        ("text matrix, per pair", per_call(lambda: comparisons.unit_text_comparison_matrix(cohort.blocks["major"], cohort.blocks["major"]), 1) / (n * n), text, abs(texts[0, 1] - expected)),
+    ]
+
+    # Every field of a pair of students
+    student = per_call(lambda: reference_compare(vectors[0], vectors[1]), max(1, number // 10))
+    expected = reference_compare(vectors[0], vectors[1])
+    matrix = cohort.similarity(cohort)
+    rows += [
+        ("student, reference", student, student, 0.0),
+        ("Student.compare_to", per_call(lambda: students[0].compare_to(students[1]), number), student, abs(students[0].compare_to(students[1]) - expected)),
+        ("Cohort.similarity", per_call(lambda: cohort.similarity(cohort), 1) / (n * n), student, abs(matrix[0, 1] - expected)),
+    ]
+
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the per-pair and matrix comparison kernels")
+    parser.add_argument("--dim", type=int, default=300, help="size of the text vectors")
+    parser.add_argument("--students", type=int, default=500, help="students compared by the matrix kernels")
+    parser.add_argument("--number", type=int, default=2000, help="calls timed per run of the per-pair kernels")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Students need a model to import, but these students are never embedded, so a tiny stand-in is enough
+        if "MODEL_DIR" not in os.environ:
+            make_model(model_dir, make_vocabulary(10), args.dim)
+            os.environ["MODEL_DIR"] = model_dir
+
+        rows = run(args.dim, args.students, args.number)
+
+    print(f"{'kernel':<24}{'us/pair':>12}{'speedup':>10}{'error':>12}")
+    for name, micros, baseline, error in rows:
+        print(f"{name:<24}{micros:>12.4f}{baseline / micros:>9.1f}x{error:>12.2e}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The backend modules are imported from their own folder, the same way the API runs them
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, backend_path)
+
+from benchmark import make_cohort, make_model, make_vocabulary
+
+# The backend reads the model location when it is first imported, so every test runs on the same small stand-in
+# model instead of the real word vectors
+vocabulary = make_vocabulary(300)
+model_dir = tempfile.TemporaryDirectory()
+make_model(model_dir.name, vocabulary, 16)
+os.environ["MODEL_DIR"] = model_dir.name
+
+@pytest.fixture
+def cohort():
+    """
+    Generate synthetic cohorts of student models, the same seed always gives the same cohort
+
+    :return: Function taking the number of students, the share of mentors and a seed
+    """
+    from student import StudentModel
+
+    def make(n: int, mentor_ratio: float = 0.25, seed: int = 0) -> list:
+        return [StudentModel.model_validate(student) for student in make_cohort(n, mentor_ratio, 0.3, vocabulary, seed)]
+
+    return make
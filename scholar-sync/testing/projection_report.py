@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# The backend modules are imported from their own folder, the same way the API runs them
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, backend_path)
+
+from benchmark import make_vocabulary, make_model, make_cohort
+
+def frequent_words(model, size: int) -> list[str]:
+    """
+    Find the most frequent plain words of a model, so synthetic cohorts use words the model knows
+
+    :param model: The loaded model, either a VectorStore or gensim KeyedVectors
+    :param size: The number of words to consider
+    :return: The lowercase alphabetic words among the `size` most frequent words
+    """
+    if hasattr(model, "index_to_key"):
+        words = model.index_to_key[:size]
+    else:
+        # Rows are in the order of the word2vec file, most frequent first
+        positions = np.argsort(model.order)[:size]
+        words = [word.decode("utf-8") for word in model.vocab[positions]]
+
+    return [word for word in words if word.isalpha() and word.islower()]
+
+def project_students(models: list, vectors: list[dict], matrix: np.ndarray[any]) -> list:
+    """
+    Create students whose text vectors are projected. The mean of projected word vectors is the projection of
+    their mean, so these are the vectors a projected store would give the same answers
+
+    :param models: The student models
+    :param vectors: The full-size vectors of every model (see `Student.vectorize`)
+    :param matrix: (d, dim) projection matrix
+    :return: The projected students, sharing one packed cohort
+    """
+    from cohort import Cohort
+    from student import Student, text_fields
+
+    projected = [{key: vector @ matrix if key in text_fields and len(vector) > 0 else vector for key, vector in v.items()} for v in vectors]
+    cohort = Cohort.from_vectors(projected)
+
+    return [Student(model=model, cohort=cohort, row=i) for i, model in enumerate(models)]
+
+def fidelity(full: list, projected: list, seed: int) -> dict:
+    """
+    Compare the scores and pairings of projected students with those of the full-size students
+
+    :param full: The students with full-size vectors
+    :param projected: The same students, in the same order, with projected vectors
+    :param seed: Seed for k-means
+    :return: dict of fidelity measures
+    """
+    from pairing import pair, score
+    from student import Student
+
+    def split(students):
+        return [s for s in students if s.role == "mentor"], [s for s in students if s.role != "mentor"]
+
+    mentors, mentees = split(full)
+    projected_mentors, projected_mentees = split(projected)
+
+    # Every mentee to mentor `compare_to` score, computed in one batch
+    scores = Student.similarity_matrix(mentees, mentors)
+    projected_scores = Student.similarity_matrix(projected_mentees, projected_mentors)
+    errors = np.abs(projected_scores - scores)
+
+    # Pair both versions of the cohort with the same seed
+    full_result = pair(full, "kmeans", seed=seed)
+    projected_result = pair(projected, "kmeans", seed=seed)
+
+    def mentor_of(pairs):
+        return {mentee: pair[0] for pair in pairs for mentee in pair[1:]}
+
+    full_mentors = mentor_of(full_result["pairs"])
+    projected_mentors_by_name = mentor_of(projected_result["pairs"])
+    same = sum(1 for mentee, mentor in full_mentors.items() if projected_mentors_by_name.get(mentee) == mentor)
+
+    # Score the projected pairing with the full-size vectors, so both objectives are on the same scale
+    by_name = {student.name: student for student in full}
+    clusters = [[by_name[name] for name in pair] for pair in projected_result["pairs"]]
+    projected_objective = score(clusters, [cluster[0] for cluster in clusters], [s for cluster in clusters for s in cluster[1:]])
+
+    return {
+        "score_correlation": float(np.corrcoef(scores.ravel(), projected_scores.ravel())[0, 1]),
+        "score_mean_error": float(errors.mean()),
+        "score_max_error": float(errors.max()),
+        "best_mentor_agreement": float(np.mean(scores.argmax(axis=1) == projected_scores.argmax(axis=1))),
+        "pairing_agreement": same / max(len(full_mentors), 1),
+        "objective": full_result["objective"],
+        "projected_objective": projected_objective,
+        "objective_change": projected_objective / full_result["objective"] - 1 if full_result["objective"] else 0.0,
+        "fit_seconds": full_result["debug"]["timings"]["engine"],
+        "projected_fit_seconds": projected_result["debug"]["timings"]["engine"],
+    }
+
+def run(cohort: list[dict]|None, size: int, methods: list[str], dims: list[int], seed: int) -> list[dict]:
+    """
+    Measure the fidelity of every projection method and dimension on a cohort
+
+    :param cohort: The students to pair, or None to pair a synthetic cohort of `size` students
+    :return: One result per method and dimension
+    """
+    import utils
+    from projection import fit
+    from student import Student, StudentModel
+
+    model = utils.load_model()
+    if cohort is None:
+        cohort = make_cohort(size, 0.25, 0.3, frequent_words(model, 20000), seed)
+
+    # Mentors first, the same order `pair_students` uses
+    models = sorted((StudentModel.model_validate(student) for student in cohort), key=lambda model: model.role != "mentor")
+    vectors = Student.vectorize(models)
+    full = Student.from_models(models)
+
+    results = []
+    for method in methods:
+        for dim in dims:
+            start = time.perf_counter()
+            matrix = fit(model.vectors, method, dim, seed)
+            fit_time = time.perf_counter() - start
+
+            result = {"method": method, "dim": dim, "projection_seconds": fit_time, **fidelity(full, project_students(models, vectors, matrix), seed)}
+            results.append(result)
+
+            print(
+                f"{method:<7} dim={dim:<4} correlation={result['score_correlation']:.4f} "
+                f"mean_error={result['score_mean_error']:.4f} best_mentor={result['best_mentor_agreement']:.1%} "
+                f"same_pairs={result['pairing_agreement']:.1%} objective={result['objective_change']:+.2%} "
+                f"fit={result['fit_seconds']:.3f}s->{result['projected_fit_seconds']:.3f}s",
+                flush=True,
+            )
+
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare scores and pairings of projected word vectors with the full-size vectors")
+    parser.add_argument("--cohort", help="JSON file with the students to pair, as sent to /api/v1/pairs (default: a synthetic cohort)")
+    parser.add_argument("--size", type=int, default=1000, help="number of students in the synthetic cohort")
+    parser.add_argument("--methods", nargs="+", default=["pca", "random"], help="projection methods to compare")
+    parser.add_argument("--dims", type=int, nargs="+", default=[32, 64, 128], help="projected dimensions to compare")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic cohort, random projections and k-means")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Without a real model (MODEL_DIR), a stand-in model is used. Its random vectors have no structure for PCA to
+        # find, so only reports made with the real model say which dimension to choose
+        if "MODEL_DIR" not in os.environ:
+            make_model(model_dir, make_vocabulary(5000, args.seed), 300, args.seed)
+            os.environ["MODEL_DIR"] = model_dir
+
+        # The full-size vectors are compared, so any configured projection is ignored
+        os.environ.pop("EMBEDDING_PROJECTION", None)
+
+        cohort = None
+        if args.cohort:
+            with open(args.cohort) as f:
+                cohort = json.load(f)
+
+        results = run(cohort, args.size, args.methods, args.dims, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+# The backend modules are imported from their own folder, the same way the API runs them
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, backend_path)
+
+from cache import ResultCache
+
+def test_disk_hit_larger_than_memory(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    value = {"pairs": [["mentor", "mentee"]] * 100}
+
+    # The entry is too large for memory, so only the SQLite file keeps it
+    cache = ResultCache(10, 64, 60, path)
+    cache.put("key", value)
+    assert len(cache) == 0
+
+    assert cache.get("key") == value
+    assert cache.get("key") == value
+    assert cache.stats()["disk_hits"] == 2
+
+    # Another process opening the same file is served the same entry
+    assert ResultCache(10, 64, 60, path).get("key") == value
+
+def test_memory_limits():
+    cache = ResultCache(2, 1024, 60)
+    for i in range(3):
+        cache.put(f"key{i}", {"value": i})
+
+    assert cache.get("key0") is None
+    assert cache.get("key2") == {"value": 2}
+    assert cache.stats()["evictions"] == 1
+
+def test_expiry():
+    cache = ResultCache(2, 1024, 0.01)
+    cache.put("key", {"value": 1})
+    time.sleep(0.02)
+
+    assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
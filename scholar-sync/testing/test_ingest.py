@@ -0,0 +1,91 @@
+import asyncio
+import csv
+import io
+import json
+import ingest
+
+def upload(text: str, format: str, chunk_size: int = 7):
+    """
+    Ingest an upload sent in small chunks, so rows and characters are split across chunks
+
+    :param text: The body of the upload
+    :param format: Either "csv" or "ndjson"
+    :param chunk_size: The number of bytes per chunk
+    :return: The valid students, the errors of invalid rows and the number of rows read
+    """
+    body = text.encode("utf-8")
+
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    return asyncio.run(ingest.ingest(chunks(), format))
+
+def csv_rows(students: list[dict]) -> list[list[str]]:
+    return [["" if value is None else str(value) for value in student.values()] for student in students]
+
+def test_csv_rows(cohort):
+    students = [model.model_dump(mode="json") for model in cohort(6, seed=9)]
+    header = list(students[0])
+    rows = csv_rows(students)
+
+    # Quoted values can hold commas, escaped quotes and line breaks
+    rows[1][header.index("description")] = 'likes "quotes", commas\nand more than one line'
+    rows[2][header.index("major")] = 'say ""hi""'
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows([header] + rows)
+    result, errors, count = upload(out.getvalue(), "csv")
+
+    assert count == 6
+    assert errors == []
+    assert [student.name for student in result] == [student["name"] for student in students]
+
+def test_csv_malformed_rows(cohort):
+    students = [model.model_dump(mode="json") for model in cohort(5, seed=10)]
+    header = list(students[0])
+    rows = csv_rows(students)
+
+    lines = [",".join(header)]
+    for row in rows:
+        out = io.StringIO()
+        csv.writer(out, lineterminator="").writerow(row)
+        lines.append(out.getvalue())
+
+    # A row missing its last value, a row with one value too many, a value with text after its closing quote and
+    # a class year that isn't a number
+    lines.insert(2, lines[1].rsplit(",", 1)[0])
+    lines.insert(4, lines[3] + ",extra")
+    lines.insert(5, '"Student X"oops' + lines[3][lines[3].index(","):])
+    lines.insert(7, lines[6].replace(str(students[2]["class_year"]), "soon", 1))
+
+    result, errors, count = upload("\n".join(lines) + "\n", "csv")
+
+    assert count == 9
+    assert [error["row"] for error in errors] == [2, 4, 5, 7]
+    assert "expected" in errors[0]["error"] and "expected" in errors[1]["error"]
+    assert "class_year" in errors[3]["error"]
+    assert len(result) == 5
+
+def test_csv_unterminated_value(cohort):
+    students = [model.model_dump(mode="json") for model in cohort(2, seed=11)]
+    header = list(students[0])
+    rows = csv_rows(students)
+
+    text = ",".join(header) + "\n" + ",".join(rows[0]) + '\n"never closed,' + ",".join(rows[1][1:]) + "\n"
+    result, errors, count = upload(text, "csv")
+
+    assert len(result) == 1
+    assert errors == [{"row": 2, "error": "unterminated quoted value"}]
+
+def test_ndjson_malformed_rows(cohort):
+    students = [model.model_dump(mode="json") for model in cohort(4, seed=12)]
+    lines = [json.dumps(student) for student in students]
+    lines.insert(1, "{not json")
+    lines.insert(3, json.dumps({**students[0], "class_year": "soon"}))
+
+    result, errors, count = upload("\n".join(lines), "ndjson")
+
+    assert count == 6
+    assert [error["row"] for error in errors] == [2, 4]
+    assert len(result) == 4
@@ -0,0 +1,48 @@
+import math
+import time
+import pytest
+import jobs
+import pairing
+from jobs import JobQueue, QueueFullError
+
+def test_job_done(cohort):
+    models = cohort(40, seed=13)
+    queue = JobQueue(1, 4, initializer=jobs.start_worker)
+    try:
+        job = queue.submit(pairing.pair_students, models, "kmeans", seed=1, cache=False)
+        result = job.future.result(timeout=120)
+
+        # The worker pairs the students the same way as the serving process
+        assert job.status == "done"
+        assert queue.get(job.id).to_dict()["result"]["pairs"] == result["pairs"]
+        assert result["pairs"] == pairing.pair_students(models, "kmeans", seed=1, cache=False)["pairs"]
+    finally:
+        queue.shutdown()
+
+def test_full_queue_rejected():
+    queue = JobQueue(1, 2)
+    try:
+        first = queue.submit(time.sleep, 0.5)
+        second = queue.submit(time.sleep, 0)
+        with pytest.raises(QueueFullError):
+            queue.submit(time.sleep, 0)
+
+        # Finished jobs make room again, once the queue has seen them finish
+        first.future.result(timeout=60)
+        second.future.result(timeout=60)
+        deadline = time.time() + 10
+        while queue.pending > 0 and time.time() < deadline:
+            time.sleep(0.01)
+        third = queue.submit(math.sqrt, -1)
+        with pytest.raises(ValueError):
+            third.future.result(timeout=60)
+        assert third.status == "failed"
+        assert "math domain error" in third.to_dict()["error"]
+    finally:
+        queue.shutdown()
+
+def test_run_parallel_keeps_order():
+    try:
+        assert jobs.run_parallel(math.sqrt, [float(i * i) for i in range(10)], 3) == [float(i) for i in range(10)]
+    finally:
+        jobs.shutdown_pool()
@@ -0,0 +1,84 @@
+import random
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+import pairing
+from assignment import capacitated_assignment, default_capacity
+from kmeans import Heap, Object
+from student import Student
+
+def test_heap_pops_like_a_sorted_list():
+    rng = random.Random(0)
+
+    # The heap replaced a list kept sorted by inserting after every item with the same distance, so equal
+    # distances must still come out in the order they went in
+    heap = Heap()
+    expected = []
+    for i in range(500):
+        obj = Object(i)
+        obj.nearest_distance = rng.choice([0.1, 0.2, 0.3, rng.random()])
+        heap.append(obj)
+
+        position = len(expected)
+        for j, other in enumerate(expected):
+            if other.nearest_distance > obj.nearest_distance:
+                position = j
+                break
+        expected.insert(position, obj)
+
+        # Pop now and then, like objects leave the heap while clusters are filled
+        if i % 7 == 6:
+            assert heap.pop() is expected.pop(0)
+
+    popped = []
+    while not heap.isEmpty():
+        popped.append(heap.pop())
+    assert popped == expected
+
+def test_packed_students_pair_the_same(cohort):
+    models = cohort(60, seed=7)
+
+    # Students embedded together share one packed cohort, students created one by one each have their own
+    packed = pairing.pair(Student.from_models(models), seed=1)
+    separate = pairing.pair([Student(model) for model in models], seed=1)
+
+    assert packed["pairs"] == separate["pairs"]
+    assert packed["objective"] == pytest.approx(separate["objective"])
+
+def test_exact_assignment_is_optimal():
+    rng = np.random.default_rng(0)
+
+    # Small groups keep every slot, large capacities and many groups only keep slots objects can use
+    for n, k, high in [(12, 3, 6), (30, 4, 30), (40, 25, 40), (7, 7, 1)]:
+        for _ in range(10):
+            distances = rng.random((n, k))
+            capacities = rng.integers(1, high + 1, size=k)
+            capacities[0] += max(0, n - capacities.sum())
+
+            labels, objective = capacitated_assignment(distances, capacities)
+            assert np.all(np.bincount(labels, minlength=k) <= capacities)
+            assert objective == pytest.approx(distances[np.arange(n), labels].sum())
+
+            # Solve the same problem with one column per unit of capacity
+            owners = np.repeat(np.arange(k), np.minimum(capacities, n))
+            rows, cols = linear_sum_assignment(distances[:, owners])
+            assert objective == pytest.approx(distances[rows, owners[cols]].sum())
+
+def test_exact_engine(cohort):
+    models = cohort(60, seed=8)
+    mentors = [model for model in models if model.role == "mentor"]
+    capacity = default_capacity(len(models) - len(mentors), len(mentors))
+
+    # The exact engine fills mentors to the same size as k-means, so it can only find pairs that are as close or closer
+    exact = pairing.pair_students(models, engine="exact", cache=False)
+    kmeans = pairing.pair_students(models, engine="kmeans", seed=1, cache=False)
+    assert all(len(pair) - 1 <= capacity for pair in exact["pairs"])
+    assert exact["objective"] <= kmeans["objective"] + 1e-9
+
+    # Mentee limits above and below the even share are both kept
+    limits = {mentor.name: limit for mentor, limit in zip(mentors, [1, 5, 2, 5, 1, 5])}
+    limited = [model.model_copy(update={"mentee_limit": limits[model.name]}) if model.name in limits else model for model in models]
+    result = pairing.pair_students(limited, engine="exact", cache=False)
+    assert sorted(name for pair in result["pairs"] for name in pair) == sorted(model.name for model in models)
+    for pair in result["pairs"]:
+        assert len(pair) - 1 <= limits.get(pair[0], capacity)
@@ -0,0 +1,110 @@
+import pairing
+from assignment import default_capacity
+from pairing import CohortDelta
+
+def check(result: dict, expected: list[str], mentors: int):
+    """
+    Check the invariants of repaired pairs
+
+    :param result: The result of `pairing.repair`
+    :param expected: The names of every student that should be paired
+    :param mentors: The number of mentors that should be paired
+    :return: The mentor of every mentee, by name
+    """
+    pairs = result["pairs"]
+    assert len(pairs) == mentors
+
+    # Every remaining student is placed exactly once
+    names = [name for pair in pairs for name in pair]
+    assert sorted(names) == sorted(expected)
+
+    # No pair is over capacity
+    capacity = default_capacity(len(expected) - mentors, mentors)
+    assert all(len(pair) - 1 <= capacity for pair in pairs)
+
+    return {mentee: pair[0] for pair in pairs for mentee in pair[1:]}
+
+def kept_pairs(students: list) -> tuple[dict, list[str]]:
+    """
+    Pair students and keep the assignment so it can be repaired
+
+    :param students: The student models to pair
+    :return: The result of the pairing and the names of the students
+    """
+    result = pairing.pair_students(students, seed=1, keep=True, cache=False)
+    return result, [student.name for student in students]
+
+def test_add_mentees(cohort):
+    students = cohort(80, seed=1)
+    result, names = kept_pairs(students[:60])
+    before = {mentee: pair[0] for pair in result["pairs"] for mentee in pair[1:]}
+
+    added = students[60:]
+    repaired = pairing.repair(result["id"], CohortDelta(added=added), threshold=1)
+    after = check(repaired, names + [student.name for student in added], 20)
+
+    # Adding mentees only adds room, so with threshold=1 no pair that was already there changes
+    assert repaired["moved"] == 0
+    assert all(after[mentee] == mentor for mentee, mentor in before.items())
+
+def test_remove_mentees(cohort):
+    students = cohort(60, seed=3)
+    result, names = kept_pairs(students)
+
+    removed = names[20:30]
+    repaired = pairing.repair(result["id"], CohortDelta(removed=removed), threshold=1)
+    after = check(repaired, names[:20] + names[30:], 15)
+
+    # Pairs that still fit the smaller capacity keep every remaining mentee
+    capacity = default_capacity(len(after), 15)
+    for pair in result["pairs"]:
+        kept = [mentee for mentee in pair[1:] if mentee not in removed]
+        if len(kept) <= capacity:
+            assert all(after[mentee] == pair[0] for mentee in kept)
+
+def test_remove_mentors(cohort):
+    students = cohort(60, seed=4)
+    result, names = kept_pairs(students)
+
+    removed = names[:3]
+    repaired = pairing.repair(result["id"], CohortDelta(removed=removed), threshold=1)
+    after = check(repaired, names[3:], 12)
+
+    # Only the mentees of the mentors that left are placed again
+    for pair in result["pairs"]:
+        if pair[0] in removed:
+            assert all(after[mentee] not in removed for mentee in pair[1:])
+        else:
+            assert all(after[mentee] == pair[0] for mentee in pair[1:])
+
+def test_chained_repairs(cohort):
+    students = cohort(120, seed=5)
+    result, names = kept_pairs(students[:80])
+    expected = list(names)
+    mentors = set(names[:30])
+
+    # Each repair starts from the assignment of the one before it. Every step also adds one mentor
+    pool = students[80:]
+    for step in range(4):
+        removed = expected[step * 7 + 1:step * 7 + 9]
+        added = pool[step * 10:step * 10 + 10]
+        added[0] = added[0].model_copy(update={"role": "mentor"})
+        mentors = (mentors - set(removed)) | {added[0].name}
+
+        result = pairing.repair(result["id"], CohortDelta(added=added, removed=removed), threshold=0.01)
+        expected = [name for name in expected if name not in removed] + [student.name for student in added]
+        check(result, expected, len(mentors))
+
+def test_repair_old_id(cohort):
+    students = cohort(60, seed=6)
+    result, names = kept_pairs(students)
+
+    # The first assignment can still be repaired after it was already repaired once
+    first = pairing.repair(result["id"], CohortDelta(removed=names[40:45]))
+    check(first, names[:40] + names[45:], 15)
+
+    again = pairing.repair(result["id"], CohortDelta(removed=names[2:4] + names[50:55]))
+    check(again, names[:2] + names[4:50] + names[55:], 13)
+
+    # The students removed by the first repair can join again
+    check(pairing.repair(first["id"], CohortDelta(added=students[40:45])), names, 15)
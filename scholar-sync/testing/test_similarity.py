@@ -0,0 +1,52 @@
+import numpy as np
+from parameters import methods, weights, weights_sum
+from student import Student
+
+def reference(a: dict, b: dict) -> float:
+    """
+    Compare two students field by field from their unpacked vectors, the way students were compared before they
+    were packed
+
+    :param a: Vectors of the first student (see `Student.vectorize`)
+    :param b: Vectors of the second student
+    :return: The similarity of the two students
+    """
+    total = 0.0
+    for key in a:
+        if len(a[key]) > 0 and len(b[key]) > 0:
+            total += weights[key] * methods[key](a[key], b[key])
+
+    return total / weights_sum
+
+def test_matrix_matches_compare_to(cohort):
+    models = cohort(40, seed=1)
+    students = Student.from_models(models)
+    mentees, mentors = students[10:], students[:10]
+
+    matrix = Student.similarity_matrix(mentees, mentors)
+    expected = np.array([[mentee.compare_to(mentor) for mentor in mentors] for mentee in mentees])
+    np.testing.assert_allclose(matrix, expected, rtol=0, atol=1e-6)
+
+    # Both match comparing the unpacked vectors of every field
+    vectors = Student.vectorize(models)
+    unpacked = np.array([[reference(vectors[i], vectors[j]) for j in range(10)] for i in range(10, 40)])
+    np.testing.assert_allclose(matrix, unpacked, rtol=0, atol=1e-6)
+
+def test_matrix_matches_compare_to_for_centers(cohort):
+    students = Student.from_models(cohort(40, seed=2))
+    mentees = students[10:]
+
+    # Cluster centers are averages that don't belong to the mentees' cohort
+    centers = [students[i].average_with(mentees[i:i + 3]) for i in range(5)] + students[5:10]
+
+    matrix = Student.similarity_matrix(mentees, centers)
+    expected = np.array([[mentee.compare_to(center) for center in centers] for mentee in mentees])
+    np.testing.assert_allclose(matrix, expected, rtol=0, atol=1e-6)
+
+def test_row_similarity_matches_compare_to(cohort):
+    students = Student.from_models(cohort(40, seed=3))
+    mentees, mentors = students[10:], students[:10] * 3
+
+    rows = Student.pack(mentees).row_similarity(Student.pack(mentors))
+    expected = np.array([mentee.compare_to(mentor) for mentee, mentor in zip(mentees, mentors)])
+    np.testing.assert_allclose(rows, expected, rtol=0, atol=1e-6)